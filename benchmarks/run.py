@@ -0,0 +1,281 @@
+"""
+Offline benchmarks for ansiblecall.
+
+Run with ``hatch run bench:run`` or ``python benchmarks/run.py --output results.json``.
+Pass ``--compare previous.json`` to fail when a benchmark regresses past ``--threshold``.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import pathlib
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+
+CODE_DIR = str(pathlib.Path(__file__).parent.parent.joinpath("src").resolve())
+sys.path.insert(0, CODE_DIR)
+
+BENCHMARKS = {}
+
+
+def benchmark(fun):
+    BENCHMARKS[fun.__name__] = fun
+    return fun
+
+
+def stats(samples, unit="s"):
+    return {
+        "unit": unit,
+        "samples": len(samples),
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "max": max(samples),
+    }
+
+
+def timeit(fun, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fun()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run_python(code, env=None):
+    """Run code in a fresh interpreter and return the float it prints"""
+    ret = subprocess.run(
+        [sys.executable, "-c", textwrap.dedent(code)],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": CODE_DIR, **(env or {})},
+    )
+    return float(ret.stdout.strip().split("\n")[-1])
+
+
+@benchmark
+def import_time(args):
+    """Wall time of `import ansiblecall` in a fresh interpreter"""
+    code = """
+        import time
+        start = time.perf_counter()
+        import ansiblecall
+        print(time.perf_counter() - start)
+    """
+    return stats([run_python(code) for _ in range(args.repeat)])
+
+
+@benchmark
+def first_call(args):
+    """Latency of the first ansible.builtin.ping call in a fresh interpreter"""
+    code = """
+        import time
+        import ansiblecall
+        start = time.perf_counter()
+        ansiblecall.module("ansible.builtin.ping")
+        print(time.perf_counter() - start)
+    """
+    return stats([run_python(code) for _ in range(args.repeat)])
+
+
+@benchmark
+def warm_call(args):
+    """Latency of ansible.builtin.ping once modules are loaded and imported"""
+    import ansiblecall
+
+    agg = ansiblecall.Aggregator()
+    ansiblecall.module("ansible.builtin.ping")
+    ansiblecall.add_metrics_hook(agg)
+    try:
+        ret = stats(timeit(lambda: ansiblecall.module("ansible.builtin.ping"), repeat=args.repeat * 10))
+    finally:
+        ansiblecall.remove_metrics_hook(agg)
+    ret["phases"] = {name: values["p50"] for name, values in agg.summary()["ansible.builtin.ping"]["phases"].items()}
+    return ret
+
+
+@benchmark
+def serialize(args):
+    """Round trip of a loop-style module result through the configured JSON backend"""
+    import ansiblecall.utils.serialize
+
+    ret = {"changed": True, "results": [{"item": f"pkg{i}", "changed": True, "rc": 0} for i in range(10000)]}
+    samples = stats(
+        timeit(lambda: ansiblecall.utils.serialize.loads(ansiblecall.utils.serialize.dumps(ret)), repeat=args.repeat)
+    )
+    samples["backend"] = ansiblecall.utils.serialize.backend()[0]
+    return samples
+
+
+def make_collections(root, size):
+    """Create a synthetic collections tree holding `size` modules"""
+    per_collection = 100
+    for start in range(0, size, per_collection):
+        collection = f"bench{start // per_collection}"
+        mod_dir = pathlib.Path(root).joinpath("ansible_collections", collection, "synthetic", "plugins", "modules")
+        mod_dir.mkdir(parents=True)
+        for j in range(min(per_collection, size - start)):
+            mod_dir.joinpath(f"mod{j}.py").write_text("def main():\n    pass\n")
+
+
+@benchmark
+def load_mods(args):
+    """Module discovery over a synthetic collections tree"""
+    import ansiblecall.utils.loader
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        make_collections(root=tmp_dir, size=args.collection_size)
+        path = sys.path.copy()
+        sys.path.insert(0, tmp_dir)
+        try:
+            fun = ansiblecall.utils.loader.load_mods
+
+            def load():
+                fun.cache_clear()
+                fun()
+
+            ret = stats(timeit(load, repeat=args.repeat))
+        finally:
+            sys.path[:] = path
+            fun.cache_clear()
+    ret["modules"] = args.collection_size
+    return ret
+
+
+@benchmark
+def cache_build(args):
+    """Time to bundle a module and its dependencies into a zip file"""
+    import ansiblecall
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        return stats(
+            timeit(lambda: ansiblecall.cache(mod_name="ansible.builtin.ping", dest=tmp_dir), repeat=args.repeat)
+        )
+
+
+@benchmark
+def zip_extract(args):
+    """Time for ZipContext to extract a cached bundle in a fresh interpreter"""
+    import ansiblecall
+
+    mod_name = "ansible.builtin.ping"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ansiblecall.cache(mod_name=mod_name, dest=tmp_dir)
+        target_dir = pathlib.Path(ansiblecall.config()["cache_dir"]).joinpath(mod_name)
+        code = f"""
+            import shutil
+            import time
+            import ansiblecall.utils.ctx
+            shutil.rmtree({str(target_dir)!r}, ignore_errors=True)
+            start = time.perf_counter()
+            ansiblecall.utils.ctx.ZipContext(mod_name={mod_name!r}).reload()
+            print(time.perf_counter() - start)
+        """
+        env = {"PYTHONPATH": os.path.join(tmp_dir, mod_name + ".zip")}
+        try:
+            return stats([run_python(code, env=env) for _ in range(args.repeat)])
+        finally:
+            shutil.rmtree(target_dir, ignore_errors=True)
+
+
+@benchmark
+def respawn(args):
+    """Latency of ansible.builtin.ping respawned under a non-sudo runtime"""
+    import ansiblecall
+
+    rt = ansiblecall.Runtime()
+    return stats(timeit(lambda: ansiblecall.module("ansible.builtin.ping", rt=rt), repeat=args.repeat))
+
+
+@benchmark
+def typegen(args):
+    """TypeFactory.run throughput in modules per second"""
+    import ansiblecall
+
+    modules = sorted(m for m in ansiblecall.refresh_modules() if m.startswith("ansible.builtin."))
+    modules = modules[: args.typegen_modules]
+    code = f"""
+        import time
+        from ansiblecall.utils.typefactory import TypeFactory
+        start = time.perf_counter()
+        TypeFactory.run(modules={modules!r}, clean=False)
+        print(time.perf_counter() - start)
+    """
+    ret = stats([len(modules) / run_python(code) for _ in range(args.repeat)], unit="modules/s")
+    ret["modules"] = len(modules)
+    return ret
+
+
+def metadata():
+    ret = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+    }
+    with contextlib.suppress(ImportError):
+        import ansible.release
+
+        ret["ansible"] = ansible.release.__version__
+    return ret
+
+
+def compare(results, baseline, threshold):
+    """Return benchmarks slower than the baseline by more than threshold"""
+    ret = {}
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or previous.get("unit") != current.get("unit"):
+            continue
+        ratio = current["median"] / previous["median"]
+        # Throughput benchmarks regress when they go down
+        if current["unit"] != "s":
+            ratio = 1 / ratio
+        if ratio > threshold:
+            ret[name] = round(ratio, 3)
+    return ret
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmarks", nargs="*", metavar="BENCHMARK", help=f"One of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--collection-size", type=int, default=1000)
+    parser.add_argument("--typegen-modules", type=int, default=20)
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="Baseline JSON results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Allowed slowdown ratio against the baseline")
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in args.benchmarks or BENCHMARKS:
+        sys.stderr.write(f"Running {name}...\n")
+        results[name] = BENCHMARKS[name](args)
+    report = {"metadata": metadata(), "results": results}
+
+    if args.compare:
+        with open(args.compare) as fp:
+            report["regressions"] = compare(results, json.load(fp)["results"], threshold=args.threshold)
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,26 +3,65 @@ import time
 
 import ansiblecall.utils.cache
 import ansiblecall.utils.config
-import ansiblecall.utils.ctx
 import ansiblecall.utils.loader
+import ansiblecall.utils.metrics
+import ansiblecall.utils.profile
+import ansiblecall.utils.pycache
+from ansiblecall.utils.metrics import Aggregator  # noqa: F401
 from ansiblecall.utils.rt import Runtime
 
 log = logging.getLogger(__name__)
 
+# Before ansible is imported, so that its bytecode is read from the managed cache
+ansiblecall.utils.pycache.enable()
+
+
+def module(mod_name, *, rt: Runtime = None, stdout_as=None, **params):
+    """Run ansible module. Use stdout_as="path" or "iter" to get a large stdout as a file path or line iterator."""
+    # Lazy import. Ansible is only imported once a module is executed.
+    import ansiblecall.utils.ctx
 
-def module(mod_name, *, rt: Runtime = None, **params):
-    """Run ansible module."""
     start = time.time()
     log.debug("Running module [%s] with params [%s]", mod_name, ", ".join(list(params)))
-    mod = ansiblecall.utils.loader.get_module(mod_name=mod_name)
-    with ansiblecall.utils.ctx.Context(module=mod, params=params, runtime=rt) as ctx:
-        ret = ctx.run()
-        log.debug(
-            "Returning data to caller. Total Elapsed: %0.03fs",
-            (time.time() - start),
-        )
+    with ansiblecall.utils.metrics.call(mod_name=mod_name) as timings:
+        mod = ansiblecall.utils.loader.get_module(mod_name=mod_name)
+        with ansiblecall.utils.ctx.Context(module=mod, params=params, runtime=rt, stdout_as=stdout_as) as ctx:
+            ret = ctx.run()
+            timings.failed = isinstance(ret, dict) and bool(ret.get("failed"))
+            log.debug(
+                "Returning data to caller. Total Elapsed: %0.03fs",
+                (time.time() - start),
+            )
+
+            return ret
+
+
+def preload(mod_names):
+    """Import ansible modules and their module_utils ahead of time. Returns seconds spent per module."""
+    # Lazy import
+    import ansiblecall.utils.ctx
+
+    ret = {}
+    for mod_name in mod_names:
+        mod = ansiblecall.utils.loader.get_module(mod_name=mod_name)
+        with ansiblecall.utils.ctx.Context(module=mod) as ctx:
+            # The index build and bundle checks are not part of the import cost
+            start = time.perf_counter()
+            ctx.load(dependencies=True)
+            ret[mod_name] = time.perf_counter() - start
+        log.debug("Preloaded %s. Elapsed: %0.03fs", mod_name, ret[mod_name])
+    return ret
+
+
+def drift_scan(desired, runner=None, max_workers=None, forkserver=None):
+    """
+    Run {"module": ..., "params": {...}} entries in check and diff mode concurrently. Yields a
+    compact report of each entry that would change, or failed, as it finishes.
+    """
+    # Lazy import
+    import ansiblecall.utils.drift
 
-        return ret
+    return ansiblecall.utils.drift.drift_scan(desired, runner=runner, max_workers=max_workers, forkserver=forkserver)
 
 
 def refresh_modules():
@@ -30,8 +69,16 @@ def refresh_modules():
     return ansiblecall.utils.cache.refresh_modules()
 
 
+def compile_modules(mod_names):
+    """Compile ansible modules and the module_utils they import ahead of time. Returns the compiled files."""
+    return ansiblecall.utils.pycache.compile_modules(mod_names)
+
+
 def cache(mod_name, dest=None):
     """Cache ansible modules and dependencies into a zip file"""
+    # Lazy import
+    import ansiblecall.utils.ctx
+
     mod = ansiblecall.utils.loader.get_module(mod_name=mod_name)
     with ansiblecall.utils.ctx.Context(module=mod) as ctx:
         return ctx.cache(dest=dest)
@@ -40,3 +87,23 @@ def cache(mod_name, dest=None):
 def config():
     """Get configuration parameters"""
     return ansiblecall.utils.config.get_config()
+
+
+def profile(path, *, modules=None, rate=1.0, cprofile=True, tracemalloc=False):
+    """
+    Context manager profiling module calls, including respawned and forked ones, into path.
+    modules are glob patterns of module names to profile and rate the share of calls profiled.
+    """
+    return ansiblecall.utils.profile.profiling(
+        path, modules=modules, rate=rate, cprofile=cprofile, tracemalloc=tracemalloc
+    )
+
+
+def add_metrics_hook(fun):
+    """Register a callback receiving per-phase timings of every module call"""
+    return ansiblecall.utils.metrics.add_hook(fun)
+
+
+def remove_metrics_hook(fun):
+    """Unregister a timings callback"""
+    return ansiblecall.utils.metrics.remove_hook(fun)
@@ -0,0 +1,105 @@
+import argparse
+import json
+import logging
+import sys
+
+import ansiblecall.utils.config
+import ansiblecall.utils.server
+
+
+def parse_params(items):
+    """Parse key=value pairs. Values are read as JSON when possible."""
+    ret = {}
+    for item in items:
+        key, sep, value = item.partition("=")
+        if not sep:
+            msg = f"Invalid parameter {item!r}, expected key=value"
+            raise ValueError(msg)
+        try:
+            ret[key] = json.loads(value)
+        except json.JSONDecodeError:
+            ret[key] = value
+    return ret
+
+
+def serve(args):
+    ansiblecall.utils.server.serve(socket_path=args.socket, preload=args.preload, fork=args.fork)
+    return 0
+
+
+def compile_modules(args):
+    for path in ansiblecall.compile_modules(args.modules):
+        sys.stdout.write(f"{path}\n")
+    return 0
+
+
+def read_requests(args):
+    """Build requests from the command line, or from JSON lines on stdin when module is '-'"""
+    if args.module == "-":
+        for line in sys.stdin:
+            if line.strip():
+                request = json.loads(line)
+                yield request["module"], request.get("params"), request.get("runtime")
+        return
+    params = {**json.loads(args.params or "{}"), **parse_params(args.param)}
+    runtime = None
+    if args.become or args.become_user or args.timeout:
+        runtime = {"become": args.become, "become_user": args.become_user or "", "timeout": args.timeout}
+    yield args.module, params, runtime
+
+
+def call(args):
+    failed = False
+    try:
+        for ret in ansiblecall.utils.server.stream(read_requests(args), socket_path=args.socket):
+            failed = failed or (isinstance(ret, dict) and bool(ret.get("failed")))
+            json.dump(ret, sys.stdout)
+            sys.stdout.write("\n")
+            sys.stdout.flush()
+    except ValueError as exc:
+        sys.stderr.write(f"{exc}\n")
+        return 2
+    except OSError as exc:
+        sys.stderr.write(f"Unable to reach the ansiblecall daemon: {exc}\n")
+        return 2
+    return 1 if failed else 0
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog="ansiblecall", description="Call ansible modules")
+    parser.add_argument("--socket", help="Unix socket of the daemon")
+    parser.add_argument("--log-level", default=ansiblecall.utils.config.get_config(key="log_level"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Run a daemon keeping modules warm")
+    serve_parser.add_argument("--preload", nargs="*", default=[], metavar="MODULE", help="Modules to import at start")
+    serve_parser.add_argument("--fork", action="store_true", help="Run each request in a child of a fork server")
+    serve_parser.set_defaults(fun=serve)
+
+    compile_parser = subparsers.add_parser(
+        "compile", help="Compile modules and their module_utils into the bytecode cache ahead of time"
+    )
+    compile_parser.add_argument("modules", nargs="+", metavar="MODULE")
+    compile_parser.set_defaults(fun=compile_modules)
+
+    call_parser = subparsers.add_parser("call", help="Run a module on the daemon")
+    call_parser.add_argument(
+        "module", help="Module name, e.g. ansible.builtin.ping. Use - to read JSON requests from stdin"
+    )
+    call_parser.add_argument("param", nargs="*", help="Module parameters as key=value")
+    call_parser.add_argument("--params", help="Module parameters as a JSON object")
+    call_parser.add_argument("--become", action="store_true")
+    call_parser.add_argument("--become-user")
+    call_parser.add_argument("--timeout", type=float, help="Seconds before the module is killed")
+    call_parser.set_defaults(fun=call)
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    return args.fun(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
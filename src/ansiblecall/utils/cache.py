@@ -5,14 +5,11 @@ import pathlib
 import shutil
 import sys
 import tempfile
+import zipfile
 
 import ansiblecall.utils.config
 import ansiblecall.utils.loader
 
-CACHE_DIR = ansiblecall.utils.config.get_config(key="cache_dir")
-if not os.path.exists(CACHE_DIR):
-    os.makedirs(CACHE_DIR, exist_ok=True)
-
 log = logging.getLogger(__name__)
 
 
@@ -145,11 +142,24 @@ def save_checksum(filename: str):
     return checksum
 
 
+def make_zip(archive_name, root_dir):
+    """Zip a directory with the configured bundle compression"""
+    config = ansiblecall.utils.config.get_config()
+    compression = {"stored": zipfile.ZIP_STORED, "deflated": zipfile.ZIP_DEFLATED}[config.bundle_compression]
+    with zipfile.ZipFile(
+        archive_name + ".zip", "w", compression=compression, compresslevel=config.bundle_compresslevel
+    ) as zp:
+        for path in sorted(pathlib.Path(root_dir).rglob("*")):
+            zp.write(path, arcname=path.relative_to(root_dir))
+
+
 def cache(mod_name, dest=None):
+    cache_dir = ansiblecall.utils.config.get_config(key="cache_dir")
+    os.makedirs(cache_dir, exist_ok=True)
     with tempfile.TemporaryDirectory() as tmp_dir:
         package_libs(path=tmp_dir)
-        archive_name = os.path.join(CACHE_DIR, mod_name)
-        shutil.make_archive(archive_name, format="zip", root_dir=tmp_dir)
+        archive_name = os.path.join(cache_dir, mod_name)
+        make_zip(archive_name, root_dir=tmp_dir)
         checksum = save_checksum(filename=archive_name)
         if dest:
             for ext in [".zip", ".sha256"]:
@@ -158,12 +168,15 @@ def cache(mod_name, dest=None):
                 if dest_file.exists():
                     dest_file.unlink(missing_ok=True)
                 shutil.move(src=archive_name + ext, dst=dest)
-        log.debug("Cached %s module at %s.", mod_name, dest or CACHE_DIR)
+        log.debug("Cached %s module at %s.", mod_name, dest or cache_dir)
         return checksum
 
 
 def refresh_modules():
-    """Refresh Ansible module cache"""
-    fun = ansiblecall.utils.loader.load_mods
-    fun.cache_clear()
-    return fun()
+    """Refresh Ansible module cache, and drop libraries packaged for respawns from the old modules"""
+    ansiblecall.utils.loader.cache_clear()
+    # Only imported once a module respawned, importing it would import ansible
+    respawn = sys.modules.get("ansiblecall.utils.respawn")
+    if respawn:
+        respawn.clear_libs()
+    return ansiblecall.utils.loader.load_mods()
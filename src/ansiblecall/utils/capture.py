@@ -0,0 +1,119 @@
+import io
+import os
+import tempfile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class Capture(io.TextIOBase):
+    """
+    Text stream standing in for sys.stdout while a module runs. Output is buffered in memory
+    up to max_size bytes and spilled to a temporary file beyond that.
+    """
+
+    encoding = "utf-8"
+
+    def __init__(self, max_size):
+        super().__init__()
+        self.max_size = max_size
+        self.buffer = io.BytesIO()
+        self.spilled = False
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        self.write_bytes(s.encode(self.encoding, "surrogateescape"))
+        return len(s)
+
+    def write_bytes(self, data):
+        if not self.spilled and self.buffer.tell() + len(data) > self.max_size:
+            spill = tempfile.TemporaryFile()  # noqa: SIM115
+            spill.write(self.buffer.getbuffer())
+            self.buffer = spill
+            self.spilled = True
+        self.buffer.write(data)
+
+    def write_from(self, fp):
+        """Copy a binary file object into the capture"""
+        while chunk := fp.read(CHUNK_SIZE):
+            self.write_bytes(chunk)
+
+    def getvalue(self):
+        self.buffer.seek(0)
+        ret = self.buffer.read().decode(self.encoding, "surrogateescape")
+        self.buffer.seek(0, os.SEEK_END)
+        return ret
+
+    def last_line(self):
+        """Return the last non-empty line, scanning backwards from the end"""
+        return tail_line(self.buffer).decode(self.encoding, "surrogateescape")
+
+    def close(self):
+        self.buffer.close()
+        super().close()
+
+
+def tail_line(fp):
+    """Last non-empty line of a seekable binary file object. Leaves the position at the end."""
+    end = fp.seek(0, os.SEEK_END)
+    # Skip trailing whitespace
+    while end > 0:
+        pos = max(end - CHUNK_SIZE, 0)
+        fp.seek(pos)
+        chunk = fp.read(end - pos).rstrip()
+        if chunk:
+            end = pos + len(chunk)
+            break
+        end = pos
+    # Find the start of the line
+    start = end
+    while start > 0:
+        pos = max(start - CHUNK_SIZE, 0)
+        fp.seek(pos)
+        newline = fp.read(start - pos).rfind(b"\n")
+        if newline != -1:
+            start = pos + newline + 1
+            break
+        start = pos
+    fp.seek(start)
+    ret = fp.read(end - start)
+    fp.seek(0, os.SEEK_END)
+    return ret
+
+
+def tail(fp, size):
+    """Last size bytes of a seekable binary file object"""
+    end = fp.seek(0, os.SEEK_END)
+    fp.seek(max(end - size, 0))
+    return fp.read()
+
+
+def iter_lines(fp):
+    """Yield lines of a text file object without line endings and close it once exhausted"""
+    with fp:
+        for line in fp:
+            yield line.rstrip("\n")
+
+
+def spool_stdout(ret, stdout_as=None):
+    """
+    Move a large `stdout` out of the module return. With stdout_as="path" it is replaced by the
+    path of a file holding it, with stdout_as="iter" by an iterator over its lines. The iterator
+    reads an unnamed temporary file, so nothing is left on disk when it is dropped unread.
+    """
+    if stdout_as not in ("path", "iter") or not isinstance(ret, dict) or not isinstance(ret.get("stdout"), str):
+        return ret
+    stdout = ret.pop("stdout")
+    ret.pop("stdout_lines", None)
+    if stdout_as == "iter":
+        fp = tempfile.TemporaryFile("w+", encoding="utf-8", errors="surrogateescape")  # noqa: SIM115
+        fp.write(stdout)
+        fp.seek(0)
+        ret["stdout"] = iter_lines(fp)
+        return ret
+    fd, path = tempfile.mkstemp(prefix="ansiblecall-", suffix=".stdout")
+    with os.fdopen(fd, "w", encoding="utf-8", errors="surrogateescape") as fp:
+        fp.write(stdout)
+    ret["stdout"] = path
+    return ret
@@ -0,0 +1,112 @@
+import json
+
+import ansiblecall
+
+# Package manager modules accepting a list of packages in `name`
+PACKAGE_MODULES = frozenset(
+    {
+        "ansible.builtin.apt",
+        "ansible.builtin.dnf",
+        "ansible.builtin.dnf5",
+        "ansible.builtin.package",
+        "ansible.builtin.pip",
+        "ansible.builtin.yum",
+        "community.general.apk",
+        "community.general.homebrew",
+        "community.general.pacman",
+        "community.general.pkgng",
+        "community.general.zypper",
+    }
+)
+
+
+def fqcn(mod_name):
+    """Salt refers to modules as ansible_builtin.apt instead of ansible.builtin.apt"""
+    namespace, _, name = mod_name.partition(".")
+    if "." not in name:
+        namespace = namespace.replace("_", ".", 1)
+    return f"{namespace}.{name}"
+
+
+# Options applying to a single package, e.g. pip refuses a version with several names
+PER_PACKAGE_PARAMS = frozenset({"deb", "requirements", "version"})
+
+
+def package_names(params):
+    names = params.get("name")
+    if isinstance(names, str):
+        return [names]
+    if isinstance(names, list) and all(isinstance(n, str) for n in names):
+        return names
+    return None
+
+
+def signature(mod_name, params, rt=None):
+    """Key shared by calls that can be merged into one, None when a call cannot be merged"""
+    if fqcn(mod_name) not in PACKAGE_MODULES or package_names(params) is None:
+        return None
+    if not PER_PACKAGE_PARAMS.isdisjoint(params):
+        return None
+    others = {k: v for k, v in params.items() if k != "name"}
+    try:
+        return mod_name, json.dumps(others, sort_keys=True), json.dumps(rt and dict(rt), sort_keys=True)
+    except TypeError:
+        return None
+
+
+def group(calls):
+    """Split (mod_name, params, rt) calls into runs of adjacent mergeable calls. Returns lists of indexes."""
+    ret, previous = [], None
+    for i, (mod_name, params, rt) in enumerate(calls):
+        key = signature(mod_name, params, rt)
+        if key is not None and key == previous:
+            ret[-1].append(i)
+        else:
+            ret.append([i])
+        previous = key
+    return ret
+
+
+def merge(calls):
+    """Merge compatible calls into one call installing all their packages"""
+    mod_name, params, rt = calls[0]
+    names = []
+    for _, call_params, _ in calls:
+        names.extend(n for n in package_names(call_params) if n not in names)
+    return mod_name, {**params, "name": names}, rt
+
+
+def split(ret, count):
+    """Result of a merged invocation for each of its count calls, a shallow copy per call"""
+    if count == 1 or not isinstance(ret, dict):
+        return [ret] * count
+    return [dict(ret) for _ in range(count)]
+
+
+def invoke(runner, calls):
+    """
+    Run calls merged into one invocation. Returns one result per call. Calls share the status of
+    a successful invocation, so all of them report changed when any package changed. When the
+    invocation fails, the calls run one at a time so that each failure lands on its own call.
+    """
+    if len(calls) == 1:
+        mod_name, params, rt = calls[0]
+        return [runner(mod_name, rt=rt, **params)]
+    mod_name, params, rt = merge(calls)
+    ret = runner(mod_name, rt=rt, **params)
+    if isinstance(ret, dict) and not ret.get("failed"):
+        return split(ret, len(calls))
+    return [runner(call_mod_name, rt=call_rt, **call_params) for call_mod_name, call_params, call_rt in calls]
+
+
+def run(calls, runner=None):
+    """
+    Run (mod_name, params, rt) calls in order, merging adjacent calls to the same package module
+    with the same parameters and runtime into one invocation, see invoke(). Returns one result per call.
+    """
+    runner = runner or ansiblecall.module
+    ret = [None] * len(calls)
+    for indexes in group(calls):
+        for i, call_ret in zip(indexes, invoke(runner, [calls[i] for i in indexes]), strict=True):
+            ret[i] = call_ret
+    return ret
@@ -1,11 +1,49 @@
+import functools
+import json
+import logging
 import os
 
+log = logging.getLogger(__name__)
+
+# Every setting can be overridden by an environment variable, e.g. ANSIBLECALL_MODULE_CACHE_SIZE=64
+ENV_PREFIX = "ANSIBLECALL_"
+# YAML or JSON file read before the environment
+CONFIG_FILE = os.path.join("~", ".ansiblecall", "config.yml")
+
 
 class Config(dict):
     def __init__(self):
         super().__init__()
         self["cache_dir"] = os.path.expanduser(os.path.join("~", ".ansiblecall", "cache"))
         self["log_level"] = "info"
+        # Maximum number of imported ansible modules kept in sys.modules. 0 is unbounded.
+        self["module_cache_size"] = 256
+        # Module output beyond this many bytes is spilled to a temporary file
+        self["capture_max_size"] = 16 * 1024 * 1024
+        self["socket_path"] = os.path.expanduser(os.path.join("~", ".ansiblecall", "ansiblecall.sock"))
+        # Children forked concurrently by a fork server. 0 is max(cpu count, 4).
+        self["forkserver_processes"] = 0
+        # Tasks of a graph run concurrently
+        self["graph_workers"] = 4
+        # Compression of cached module bundles, "stored" or "deflated". Stored bundles are larger
+        # but faster to import from and extract.
+        self["bundle_compression"] = "deflated"
+        # zlib level 0-9 of deflated bundles, None is the zlib default
+        self["bundle_compresslevel"] = None
+        # Extra directories holding an ansible_collections dir, separated by os.pathsep
+        self["collections_path"] = ""
+        # "cached" packages the libraries of a respawned module once per process, "fresh" on every respawn
+        self["respawn_strategy"] = "cached"
+        # JSON library for module arguments, results and the daemon protocol: "auto", "orjson", "msgspec" or "json"
+        self["json_backend"] = "auto"
+        # Keep bytecode under cache_dir/pycache/<interpreter> instead of __pycache__ dirs next to the sources
+        self["pycache"] = False
+        # Profile module calls into this dir. Calls of modules matching one of the comma separated
+        # glob patterns in profile_modules are profiled, each with probability profile_rate.
+        self["profile_dir"] = None
+        self["profile_modules"] = ""
+        self["profile_rate"] = 1.0
+        self["profile_tracemalloc"] = False
 
     def __getattr__(self, key):
         return self.get(key)
@@ -13,9 +51,53 @@ class Config(dict):
     def __setattr__(self, key, value):
         self[key] = value
 
+    def update_from(self, values, source):
+        for key, value in values.items():
+            if key not in self:
+                log.warning("Ignoring unknown setting %s from %s.", key, source)
+                continue
+            expand = isinstance(value, str) and key.endswith(("_dir", "_path"))
+            self[key] = os.path.expanduser(value) if expand else value
 
-def get_config(key=None):
+
+def parse_env(value):
+    """Read environment values as JSON when possible, e.g. 64, true or null"""
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return value
+
+
+def read_file(path):
+    with open(path) as fp:
+        if path.endswith(".json"):
+            return json.load(fp)
+        # Lazy import
+        import yaml
+
+        return yaml.safe_load(fp) or {}
+
+
+@functools.cache
+def load():
+    """Defaults, overridden by the config file, overridden by the environment. Read once per process."""
     config = Config()
+    path = os.path.expanduser(os.environ.get(f"{ENV_PREFIX}CONFIG", CONFIG_FILE))
+    if os.path.exists(path):
+        config.update_from(read_file(path), source=path)
+    names = {key: f"{ENV_PREFIX}{key.upper()}" for key in config}
+    env = {key: parse_env(os.environ[name]) for key, name in names.items() if name in os.environ}
+    config.update_from(env, source="environment")
+    return config
+
+
+def cache_clear():
+    """Read the config file and environment again on next access"""
+    load.cache_clear()
+
+
+def get_config(key=None):
+    config = load()
     if key:
         return config.get(key)
     return config
@@ -1,18 +1,20 @@
-import importlib
 import json
 import pathlib
 import shutil
 import sys
 import zipfile
-from contextlib import ContextDecorator
-from io import StringIO
+from contextlib import ContextDecorator, nullcontext
 
 import ansible
 import ansible.modules
 from ansible.module_utils import basic
 
 import ansiblecall.utils.cache
+import ansiblecall.utils.capture
 import ansiblecall.utils.loader
+import ansiblecall.utils.metrics
+import ansiblecall.utils.profile
+import ansiblecall.utils.serialize
 from ansiblecall.utils.config import get_config
 from ansiblecall.utils.respawn import respawn_module
 
@@ -20,7 +22,7 @@ from ansiblecall.utils.respawn import respawn_module
 class Context(ContextDecorator):
     """Run ansible module with certain sys methods overridden"""
 
-    def __init__(self, module, params=None, runtime=None) -> None:
+    def __init__(self, module, params=None, runtime=None, stdout_as=None) -> None:
         super().__init__()
 
         self.__stdout = None
@@ -32,17 +34,33 @@ class Context(ContextDecorator):
         self.params = params or {}
         self.module = module
         self.runtime = runtime
+        self.stdout_as = stdout_as
 
     def cache(self, dest=None):
         return ansiblecall.utils.cache.cache(mod_name=self.module.key, dest=dest)
 
+    def load(self, *, dependencies=False):
+        """Import the ansible module, and optionally every module_utils it references"""
+        with ansiblecall.utils.metrics.phase("import"):
+            mod = ansiblecall.utils.loader.import_module(module_name=self.module.name)
+            if dependencies:
+                ansiblecall.utils.loader.import_dependencies(
+                    module_name=self.module.name,
+                    module_abs=self.module.abs,
+                )
+        return mod
+
     def run(self):
+        profile = ansiblecall.utils.profile.select(self.module.key)
         try:
             if self.runtime:
-                ansible.module_utils.common.respawn.respawn_module(runtime=self.runtime)
+                ansible.module_utils.common.respawn.respawn_module(runtime=self.runtime, profile=profile)
             else:
-                mod = importlib.import_module(self.module.name)
-                mod.main()
+                profiler = ansiblecall.utils.profile.Profiler(profile, self.module.name) if profile else nullcontext()
+                with profiler:
+                    mod = self.load()
+                    with ansiblecall.utils.metrics.phase("main"):
+                        mod.main()
         except Exception as exc:  # noqa: BLE001
             return {"failed": True, "msg": exc.results["msg"]}
         except SystemExit:
@@ -50,16 +68,17 @@ class Context(ContextDecorator):
 
     def __enter__(self):
         """Patch necessary methods to run an Ansible module"""
-        self.__ret = StringIO()
+        self.__ret = ansiblecall.utils.capture.Capture(max_size=get_config(key="capture_max_size"))
         self.__stdout = sys.stdout
         self.__argv = sys.argv
         self.__path = sys.path
 
         # Patch ANSIBLE_ARGS. All Ansible modules read their parameters from
         # this variable.
-        basic._ANSIBLE_ARGS = json.dumps(  # noqa: SLF001
-            {"ANSIBLE_MODULE_ARGS": self.params or {}},
-        ).encode("utf-8")
+        with ansiblecall.utils.metrics.phase("args"):
+            basic._ANSIBLE_ARGS = ansiblecall.utils.serialize.dumps(  # noqa: SLF001
+                {"ANSIBLE_MODULE_ARGS": self.params or {}},
+            )
 
         # Patch respawn module
         ansible.module_utils.common.respawn.respawn_module = respawn_module
@@ -77,13 +96,13 @@ class Context(ContextDecorator):
     @staticmethod
     def clean_return(val):
         """All ansible modules print the return json to stdout.
-        Read the return json in stdout from our StringIO object.
+        Read the return json in stdout from our Capture object.
         """
         ret = None
         try:
             if val:
                 val = val.strip().split("\n")[-1]
-            ret = json.loads((val or "{}").strip())
+            ret = ansiblecall.utils.serialize.loads((val or "{}").strip())
             if "invocation" in ret:
                 ret.pop("invocation")
         except (json.JSONDecodeError, TypeError) as exc:
@@ -93,13 +112,16 @@ class Context(ContextDecorator):
     @property
     def ret(self):
         """Grab return from stdout"""
-        return self.clean_return(self.__ret.getvalue())
+        with ansiblecall.utils.metrics.phase("parse"):
+            ret = self.clean_return(self.__ret.last_line())
+            return ansiblecall.utils.capture.spool_stdout(ret, stdout_as=self.stdout_as)
 
     def __exit__(self, *exc):
         """Restore all patched objects"""
         sys.argv = self.__argv
         sys.stdout = self.__stdout
         sys.path = self.__path
+        self.__ret.close()
         self.__ret = None
         delattr(sys.modules["__main__"], "_module_fqn")
         delattr(sys.modules["__main__"], "_modlib_path")
@@ -124,14 +146,16 @@ class ZipContext(ContextDecorator):
             pathlib.Path(target_dir).mkdir(parents=True, exist_ok=True)
             with zipfile.ZipFile(file=zip_filename) as zp:
                 zp.extractall(path=target_dir)
-        sys.path.insert(0, str(target_dir))
-        ansiblecall.utils.loader.load_mods.cache_clear()
+        if str(target_dir) not in sys.path:
+            sys.path.insert(0, str(target_dir))
+        ansiblecall.utils.loader.cache_clear()
         # Trigger re-import
         ansiblecall.utils.loader.reload()
 
     def __enter__(self):
         self.__path = sys.path
-        self.reload()
+        with ansiblecall.utils.metrics.phase("bundle"):
+            self.reload()
         return self
 
     def __exit__(self, *exc):
@@ -0,0 +1,90 @@
+import concurrent.futures
+import functools
+import logging
+
+import ansiblecall
+import ansiblecall.utils.forkserver
+import ansiblecall.utils.loader
+from ansiblecall.utils.graph import CHANGED, FAILED
+from ansiblecall.utils.typefactory import TypeFactory
+
+log = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=1024)
+def check_mode_support(module_abs):
+    """attributes.check_mode.support from a module's DOCUMENTATION: full, partial, none, or None when undocumented"""
+    with open(module_abs) as fp:
+        doc = TypeFactory.get_var_value(mod_str=fp.read(), var="DOCUMENTATION")
+    attributes = (TypeFactory.parse_yaml(doc) if doc else {}).get("attributes")
+    check_mode = attributes.get("check_mode") if isinstance(attributes, dict) else None
+    return check_mode.get("support") if isinstance(check_mode, dict) else None
+
+
+def supports_check_mode(mod_name):
+    mod = ansiblecall.utils.loader.get_module(mod_name=mod_name)
+    return check_mode_support(mod.abs) != "none"
+
+
+def report(name, mod_name, ret):
+    """Compact report of an entry that would change or failed, None otherwise"""
+    if not isinstance(ret, dict) or ret.get("failed"):
+        msg = ret.get("msg") if isinstance(ret, dict) else ret
+        return {"name": name, "module": mod_name, "status": FAILED, "msg": msg}
+    if ret.get("changed"):
+        return {"name": name, "module": mod_name, "status": CHANGED, "diff": ret.get("diff")}
+    return None
+
+
+def check(runner, name, mod_name, params, rt):
+    try:
+        ret = runner(mod_name, rt=rt, **{**params, "_ansible_check_mode": True, "_ansible_diff": True})
+    except Exception as exc:
+        log.exception("Drift check of %s failed.", name)
+        ret = {"failed": True, "msg": f"{type(exc).__name__}: {exc}"}
+    return report(name, mod_name, ret)
+
+
+def entries(desired):
+    """
+    Yield (name, module, params, runtime) of desired state entries to check. Entries are
+    {"module": ..., "params": {...}, "runtime": {...}, "name": ...} dicts, like daemon requests.
+    Failures to resolve a module are yielded as reports.
+    """
+    for i, entry in enumerate(desired):
+        mod_name = entry["module"]
+        name = entry.get("name") or f"{i}:{mod_name}"
+        try:
+            if not supports_check_mode(mod_name):
+                log.debug("Skipping %s, %s does not support check mode.", name, mod_name)
+                continue
+        except KeyError as exc:
+            yield report(name, mod_name, {"failed": True, "msg": str(exc)})
+            continue
+        runtime = entry.get("runtime")
+        rt = ansiblecall.Runtime(**runtime) if runtime else None
+        yield name, mod_name, entry.get("params") or {}, rt
+
+
+def drift_scan(desired, runner=None, max_workers=None, forkserver=None):
+    """
+    Run desired state entries in check and diff mode concurrently and yield a compact report of
+    each entry that would change, or failed, as soon as it finishes. Modules documenting no
+    check mode support are skipped without being run. See concurrent_runner for the runner.
+    """
+    with (
+        ansiblecall.utils.forkserver.concurrent_runner(
+            runner=runner, forkserver=forkserver, max_workers=max_workers
+        ) as (run_module, workers),
+        concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool,
+    ):
+        futures = []
+        for entry in entries(desired):
+            if isinstance(entry, dict):
+                yield entry
+            else:
+                futures.append(pool.submit(check, run_module, *entry))
+        for future in concurrent.futures.as_completed(futures):
+            ret = future.result()
+            if ret:
+                yield ret
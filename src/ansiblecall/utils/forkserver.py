@@ -0,0 +1,317 @@
+import collections
+import concurrent.futures
+import contextlib
+import dataclasses
+import importlib
+import itertools
+import logging
+import multiprocessing
+import os
+import selectors
+import signal
+import threading
+import time
+
+import ansiblecall
+import ansiblecall.utils.config
+import ansiblecall.utils.loader
+import ansiblecall.utils.metrics
+import ansiblecall.utils.profile
+import ansiblecall.utils.rt
+import ansiblecall.utils.serialize
+
+log = logging.getLogger(__name__)
+
+# module_utils used by most modules, imported once in the zygote
+COMMON_MODULE_UTILS = (
+    "ansible.module_utils.basic",
+    "ansible.module_utils.common.file",
+    "ansible.module_utils.common.locale",
+    "ansible.module_utils.common.process",
+    "ansible.module_utils.common.respawn",
+    "ansible.module_utils.common.text.converters",
+    "ansible.module_utils.six",
+)
+
+# Seconds past a call's timeout before the zygote kills its child. Respawned modules time out on their own first.
+DEADLINE_GRACE = 10
+
+CANCELLED = {"changed": False, "failed": True, "cancelled": True, "msg": "Module call cancelled"}
+
+
+def run_child(write_fd, mod_name, params, runtime, profile):
+    """Run a module in a forked child and write the result to write_fd"""
+    # Lazy import
+    import ansiblecall.utils.respawn
+
+    phases = {}
+    ansiblecall.utils.metrics.HOOKS[:] = [lambda timings: phases.update(timings.phases)]
+    # Profiling settings of the caller
+    ansiblecall.utils.profile.ACTIVE[:] = [profile] if profile else []
+    try:
+        rt = ansiblecall.Runtime(**runtime) if runtime else None
+        ret = ansiblecall.module(mod_name, rt=rt, **params)
+    except BaseException as exc:  # noqa: BLE001
+        ret = {"failed": True, "msg": f"{type(exc).__name__}: {exc}"}
+    finally:
+        # Children leave with os._exit, which skips atexit handlers
+        ansiblecall.utils.respawn.clear_libs()
+    with os.fdopen(write_fd, "wb") as fp:
+        fp.write(ansiblecall.utils.serialize.dumps({"ret": ret, "phases": phases}))
+
+
+@dataclasses.dataclass
+class Child:
+    call_id: int
+    pid: int
+    chunks: list = dataclasses.field(default_factory=list)
+    timeout: float = None
+    deadline: float = None
+    # Result replacing the output of a killed child
+    result: dict = None
+
+
+class Zygote:
+    """Process with ansible pre-imported, forking a child per module call"""
+
+    def __init__(self, conn, processes):
+        self.conn = conn
+        self.processes = processes
+        self.selector = selectors.DefaultSelector()
+        self.pending = collections.deque()
+        # read fd -> Child
+        self.children = {}
+
+    def spawn(self, call_id, mod_name, params, runtime, profile):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Own process group, so that killing the child also kills processes it started
+            os.setpgid(0, 0)
+            os.close(read_fd)
+            self.conn.close()
+            for fd in self.children:
+                os.close(fd)
+            try:
+                run_child(write_fd, mod_name, params, runtime, profile)
+            finally:
+                os._exit(0)
+        with contextlib.suppress(OSError):
+            os.setpgid(pid, pid)
+        os.close(write_fd)
+        child = Child(call_id=call_id, pid=pid, timeout=runtime and runtime.get("timeout"))
+        if child.timeout:
+            child.deadline = time.monotonic() + child.timeout + DEADLINE_GRACE
+        self.children[read_fd] = child
+        self.selector.register(read_fd, selectors.EVENT_READ)
+
+    def collect(self, read_fd):
+        data = os.read(read_fd, 65536)
+        child = self.children[read_fd]
+        if data:
+            child.chunks.append(data)
+            return
+        self.selector.unregister(read_fd)
+        os.close(read_fd)
+        del self.children[read_fd]
+        _, status = os.waitpid(child.pid, 0)
+        if child.result:
+            ret = {"ret": child.result, "phases": {}}
+        else:
+            try:
+                ret = ansiblecall.utils.serialize.loads(b"".join(child.chunks))
+            except ValueError:
+                ret = {"ret": {"failed": True, "msg": f"Module process exited with status {status}"}, "phases": {}}
+        if isinstance(ret["ret"], dict) and ret["ret"].get("timed_out"):
+            # Processes a timed out module started outlive the child that returned the result
+            with contextlib.suppress(OSError):
+                os.killpg(child.pid, signal.SIGKILL)
+        self.conn.send((child.call_id, ret))
+
+    @staticmethod
+    def kill(child, result):
+        """Kill a child and its processes. Its call resolves to result once its pipe closes."""
+        child.result = result
+        with contextlib.suppress(OSError):
+            os.killpg(child.pid, signal.SIGKILL)
+
+    def cancel(self, call_id):
+        for request in self.pending:
+            if request[0] == call_id:
+                self.pending.remove(request)
+                self.conn.send((call_id, {"ret": CANCELLED, "phases": {}}))
+                return
+        for child in self.children.values():
+            if child.call_id == call_id and not child.result:
+                self.kill(child, CANCELLED)
+                return
+
+    def timeout(self):
+        """Seconds until the next child deadline, None without deadlines"""
+        deadlines = [child.deadline for child in self.children.values() if child.deadline and not child.result]
+        return max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+
+    def expire(self):
+        now = time.monotonic()
+        for child in self.children.values():
+            if child.deadline and not child.result and child.deadline <= now:
+                self.kill(child, ansiblecall.utils.rt.timed_out(child.timeout))
+
+    def schedule(self):
+        while self.pending and len(self.children) < self.processes:
+            self.spawn(*self.pending.popleft())
+
+    def serve(self):
+        self.selector.register(self.conn, selectors.EVENT_READ)
+        try:
+            while True:
+                for key, _ in self.selector.select(timeout=self.timeout()):
+                    if key.fileobj is self.conn:
+                        try:
+                            request = self.conn.recv()
+                        except EOFError:
+                            return
+                        if request is None:
+                            return
+                        if request[0] == "cancel":
+                            self.cancel(request[1])
+                        else:
+                            self.pending.append(request[1:])
+                    else:
+                        self.collect(key.fileobj)
+                self.expire()
+                self.schedule()
+        finally:
+            for child in self.children.values():
+                with contextlib.suppress(OSError):
+                    os.killpg(child.pid, signal.SIGKILL)
+                os.waitpid(child.pid, 0)
+
+
+def zygote(conn, preload, processes):
+    import ansiblecall.utils.ctx
+
+    for name in COMMON_MODULE_UTILS:
+        with contextlib.suppress(ImportError):
+            importlib.import_module(name)
+    ansiblecall.utils.loader.load_mods()
+    if preload:
+        ansiblecall.preload(preload)
+    Zygote(conn=conn, processes=processes).serve()
+
+
+class ForkServer:
+    """
+    Run modules isolated in children forked from a zygote process that has ansible and common
+    module_utils already imported. Each call costs one fork instead of one interpreter start,
+    and modules leaking globals, monkeypatches or cwd changes cannot taint the caller.
+
+    Start the fork server before the calling process spawns threads.
+    """
+
+    def __init__(self, preload=None, processes=None):
+        self.preload = preload or []
+        self.processes = (
+            processes or ansiblecall.utils.config.get_config(key="forkserver_processes") or max(os.cpu_count() or 1, 4)
+        )
+        self.process = None
+        self.conn = None
+        self.futures = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._reader = None
+
+    def start(self):
+        ctx = multiprocessing.get_context("fork")
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=zygote,
+            args=(child_conn, self.preload, self.processes),
+            name="ansiblecall-zygote",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self._reader = threading.Thread(target=self.read, name="ansiblecall-forkserver", daemon=True)
+        self._reader.start()
+        return self
+
+    def read(self):
+        while True:
+            try:
+                call_id, ret = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self.futures.pop(call_id)
+            future.set_result(ret)
+        with self._lock:
+            futures, self.futures = self.futures, {}
+        for future in futures.values():
+            future.set_result({"ret": {"failed": True, "msg": "Fork server exited."}, "phases": {}})
+
+    def submit(self, mod_name, *, rt=None, **params):
+        """Queue a module call. Returns a future resolving to the raw child response."""
+        future = concurrent.futures.Future()
+        with self._lock:
+            call_id = next(self._ids)
+            self.futures[call_id] = future
+            profile = ansiblecall.utils.profile.current()
+            self.conn.send(("call", call_id, mod_name, params, rt and dict(rt), profile))
+        future.call_id = call_id
+        return future
+
+    def cancel(self, future):
+        """Stop a submitted call. Its future resolves to a cancelled result."""
+        with self._lock:
+            if future.done() or self.futures.get(future.call_id) is not future:
+                return False
+            self.conn.send(("cancel", future.call_id))
+        return True
+
+    def module(self, mod_name, *, rt=None, **params):
+        """Run ansible module in a forked child"""
+        with ansiblecall.utils.metrics.call(mod_name=mod_name) as timings:
+            ret = self.submit(mod_name, rt=rt, **params).result()
+            timings.phases.update(ret["phases"])
+            ret = ret["ret"]
+            timings.failed = isinstance(ret, dict) and bool(ret.get("failed"))
+            return ret
+
+    def stop(self):
+        if self.process is None:
+            return
+        with self._lock, contextlib.suppress(OSError):
+            # Ask the zygote to exit, which closes its end of the pipe and stops the reader
+            self.conn.send(None)
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self._reader.join()
+        self.conn.close()
+        self.conn = self.process = self._reader = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+@contextlib.contextmanager
+def concurrent_runner(runner=None, forkserver=None, max_workers=None):
+    """
+    Yield (runner, max_workers) to run module calls concurrently with. Without a runner, calls run
+    in `forkserver`, or in a fork server started for the block. Pass a fork server started earlier
+    when the calling process already runs threads. Where fork is unavailable, calls run in-process
+    one at a time.
+    """
+    max_workers = max_workers or ansiblecall.utils.config.get_config(key="graph_workers")
+    if runner is not None or forkserver is not None:
+        yield runner or forkserver.module, max_workers
+    elif "fork" in multiprocessing.get_all_start_methods():
+        with ForkServer(processes=max_workers) as started:
+            yield started.module, max_workers
+    else:
+        yield ansiblecall.module, 1
@@ -0,0 +1,215 @@
+import concurrent.futures
+import dataclasses
+import logging
+import time
+from collections.abc import Callable
+
+import ansiblecall
+import ansiblecall.utils.coalesce
+import ansiblecall.utils.forkserver
+
+log = logging.getLogger(__name__)
+
+OK = "ok"
+CHANGED = "changed"
+FAILED = "failed"
+SKIPPED = "skipped"
+BLOCKED = "blocked"
+
+
+@dataclasses.dataclass(kw_only=True)
+class Task:
+    name: str
+    mod_name: str
+    params: dict = dataclasses.field(default_factory=dict)
+    rt: ansiblecall.Runtime = None
+    requires: list[str] = dataclasses.field(default_factory=list)
+    # Called with the results of finished tasks, the task is skipped when it returns False
+    when: Callable = None
+
+
+@dataclasses.dataclass(kw_only=True)
+class TaskResult:
+    name: str
+    status: str
+    ret: dict = None
+    start: float = None
+    elapsed: float = 0.0
+
+    @property
+    def changed(self):
+        return self.status == CHANGED
+
+    @property
+    def failed(self):
+        return self.status == FAILED
+
+
+@dataclasses.dataclass(kw_only=True)
+class GraphResult:
+    results: dict[str, TaskResult]
+    elapsed: float
+    critical_path: list[str]
+    critical_path_time: float
+
+    @property
+    def failed(self):
+        return any(r.status in (FAILED, BLOCKED) for r in self.results.values())
+
+    def __getitem__(self, name):
+        return self.results[name]
+
+
+def changed(*names):
+    """Condition true when any of the named tasks reported a change"""
+    return lambda results: any(results[name].changed for name in names)
+
+
+def status(ret):
+    if not isinstance(ret, dict) or ret.get("failed"):
+        return FAILED
+    if ret.get("skipped"):
+        return SKIPPED
+    return CHANGED if ret.get("changed") else OK
+
+
+class Graph:
+    """
+    Run module calls with declared dependencies. Independent branches run concurrently,
+    failed tasks block their dependents.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+
+    def add(self, name, mod_name, /, *, rt=None, requires=None, when=None, **params):
+        if name in self.tasks:
+            msg = f"Task {name!r} already exists"
+            raise ValueError(msg)
+        task = Task(name=name, mod_name=mod_name, params=params, rt=rt, requires=list(requires or []), when=when)
+        self.tasks[name] = task
+        return task
+
+    def order(self):
+        """Tasks in dependency order. Raises ValueError on unknown dependencies and cycles."""
+        ret, visiting, visited = [], set(), set()
+
+        def visit(name, parent=None):
+            if name not in self.tasks:
+                msg = f"Task {parent!r} requires unknown task {name!r}"
+                raise ValueError(msg)
+            if name in visited:
+                return
+            if name in visiting:
+                msg = f"Dependency cycle through task {name!r}"
+                raise ValueError(msg)
+            visiting.add(name)
+            for dep in self.tasks[name].requires:
+                visit(dep, parent=name)
+            visiting.discard(name)
+            visited.add(name)
+            ret.append(name)
+
+        for name in self.tasks:
+            visit(name)
+        return ret
+
+    def critical_path(self, results):
+        """Longest chain of dependent tasks by elapsed time"""
+        finish, previous = {}, {}
+        for name in self.order():
+            deps = self.tasks[name].requires
+            slowest = max(deps, key=lambda dep: finish[dep], default=None)
+            previous[name] = slowest
+            finish[name] = results[name].elapsed + (finish[slowest] if slowest else 0.0)
+        path, name = [], max(finish, key=finish.get, default=None)
+        total = finish.get(name, 0.0)
+        while name:
+            path.append(name)
+            name = previous[name]
+        return path[::-1], total
+
+    def ready(self, results, running):
+        for name, task in self.tasks.items():
+            if name in results or name in running:
+                continue
+            if all(dep in results for dep in task.requires):
+                yield task
+
+    def resolve(self, task, results):
+        """Result for a task that must not run, None when it should run"""
+        blocked = [dep for dep in task.requires if results[dep].status in (FAILED, BLOCKED)]
+        if blocked:
+            return TaskResult(name=task.name, status=BLOCKED, ret={"msg": f"Blocked by {', '.join(blocked)}"})
+        if task.when is not None and not task.when(results):
+            return TaskResult(name=task.name, status=SKIPPED, ret={"skipped": True, "msg": "Condition not met"})
+        return None
+
+    @staticmethod
+    def group(tasks, *, coalesce=False):
+        if not coalesce:
+            return [[task] for task in tasks]
+        calls = [(task.mod_name, task.params, task.rt) for task in tasks]
+        return [[tasks[i] for i in indexes] for indexes in ansiblecall.utils.coalesce.group(calls)]
+
+    @staticmethod
+    def execute(runner, tasks):
+        """Run tasks merged into one invocation, see coalesce.invoke()"""
+
+        def guarded(mod_name, rt=None, **params):
+            try:
+                return runner(mod_name, rt=rt, **params)
+            except Exception as exc:
+                log.exception("Task %s failed.", ", ".join(task.name for task in tasks))
+                return {"failed": True, "msg": f"{type(exc).__name__}: {exc}"}
+
+        calls = [(task.mod_name, task.params, task.rt) for task in tasks]
+        start = time.perf_counter()
+        rets = ansiblecall.utils.coalesce.invoke(guarded, calls)
+        elapsed = time.perf_counter() - start
+        return {
+            task.name: TaskResult(name=task.name, status=status(ret), ret=ret, start=start, elapsed=elapsed)
+            for task, ret in zip(tasks, rets, strict=True)
+        }
+
+    def run(self, runner=None, max_workers=None, *, coalesce=False, forkserver=None):
+        """
+        Run all tasks, by default in a fork server so that concurrent branches do not share process
+        state, see concurrent_runner. With coalesce, adjacent ready tasks calling the same package
+        module with the same parameters and runtime are merged into a single invocation.
+        """
+        self.order()
+        results, running = {}, {}
+        with (
+            ansiblecall.utils.forkserver.concurrent_runner(
+                runner=runner, forkserver=forkserver, max_workers=max_workers
+            ) as (run_module, workers),
+            concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool,
+        ):
+            start = time.perf_counter()
+            while len(results) < len(self.tasks):
+                tasks = []
+                for task in list(self.ready(results, running)):
+                    ret = self.resolve(task, results)
+                    if ret:
+                        results[task.name] = ret
+                    else:
+                        tasks.append(task)
+                for group in self.group(tasks, coalesce=coalesce):
+                    future = pool.submit(self.execute, run_module, group)
+                    running.update((task.name, future) for task in group)
+                if not running:
+                    continue
+                done, _ = concurrent.futures.wait(set(running.values()), return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    for name, ret in future.result().items():
+                        results[name] = ret
+                        del running[name]
+
+        path, path_time = self.critical_path(results)
+        return GraphResult(
+            results={name: results[name] for name in self.tasks},
+            elapsed=time.perf_counter() - start,
+            critical_path=path,
+            critical_path_time=path_time,
+        )
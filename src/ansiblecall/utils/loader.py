@@ -1,31 +1,113 @@
+import ast
+import collections
+import collections.abc
+import contextlib
 import functools
-import glob
 import importlib
+import importlib.util
 import logging
 import os
 import pathlib
 import sys
+import threading
 import time
 
+import ansiblecall.utils.config
+import ansiblecall.utils.metrics
+
 log = logging.getLogger(__name__)
 
+# Imported ansible modules in least recently used order
+IMPORTED = collections.OrderedDict()
+_imported_lock = threading.Lock()
+
 
 def has_salt():
     return "__salt__" in globals()
 
 
-def load_module(module_key, module_name, module_path, module_abs):
-    # Lazy import
-    import ansiblecall
+class ModuleRecord:
+    """Indexed ansible module. Calling it runs the module, like ansiblecall.module(*args, name=key, **kwargs)."""
 
-    ret = {}
-    proxy_mod = functools.partial(ansiblecall.module, name=module_key)
-    proxy_mod.path = module_path
-    proxy_mod.name = module_name
-    proxy_mod.abs = module_abs
-    proxy_mod.key = module_key
-    ret[module_key] = proxy_mod
-    return ret
+    __slots__ = ("abs", "key", "name", "path")
+
+    def __init__(self, key, name, path, abs):  # noqa: A002
+        self.key = key
+        self.name = name
+        self.path = path
+        self.abs = abs
+
+    def __call__(self, *args, **kwargs):
+        # Lazy import
+        import ansiblecall
+
+        return ansiblecall.module(*args, **{"name": self.key, **kwargs})
+
+    def __repr__(self):
+        return f"ModuleRecord({self.key!r}, {self.abs!r})"
+
+
+class ModuleIndex(collections.abc.Mapping):
+    """
+    Module key to ModuleRecord mapping. Modules are stored in parallel lists and records
+    are only created when looked up.
+    """
+
+    def __init__(self):
+        self._index = {}
+        self._names = []
+        self._paths = []
+        self._abs = []
+
+    def add(self, key, name, path, abs):  # noqa: A002
+        i = self._index.get(key)
+        if i is None:
+            self._index[key] = len(self._names)
+            self._names.append(name)
+            self._paths.append(path)
+            self._abs.append(abs)
+        else:
+            self._names[i], self._paths[i], self._abs[i] = name, path, abs
+
+    def __getitem__(self, key):
+        i = self._index[key]
+        return ModuleRecord(key, self._names[i], self._paths[i], self._abs[i])
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+def collection_roots():
+    """
+    Directories that may hold an ansible_collections dir.
+    Refer: https://docs.ansible.com/ansible/latest/collections_guide/collections_installing.html#installing-collections-with-ansible-galaxy
+    """
+    roots = [*sys.path]
+    collections_paths = os.environ.get("ANSIBLE_COLLECTIONS_PATH", "~/.ansible/collections")
+    extra_paths = ansiblecall.utils.config.get_config(key="collections_path") or ""
+    for paths in (extra_paths, collections_paths):
+        roots.extend(os.path.expanduser(p) for p in paths.split(os.pathsep) if p)
+    return [root for root in roots if not str(root).endswith(".zip")]
+
+
+def iter_collections():
+    """Yield (collections root, namespace, collection name, collection path) of installed collections"""
+    for collections_root in collection_roots():
+        base = os.path.join(collections_root, "ansible_collections")
+        if not os.path.isdir(base):
+            continue
+        for namespace in os.scandir(base):
+            if not namespace.is_dir() or namespace.name.startswith(("_", ".")):
+                continue
+            for coll in os.scandir(namespace.path):
+                if coll.is_dir() and not coll.name.startswith(("_", ".")):
+                    yield collections_root, namespace.name, coll.name, coll.path
 
 
 @functools.lru_cache
@@ -34,61 +116,102 @@ def load_mods():
     # Lazy import
     import ansible.modules
 
-    ret = {}
+    ret = ModuleIndex()
+    # Ansible modules will be referred in salt as 2 parts ansible_builtin.ping instead of
+    # ansible.builtin.ping.
+    salt = has_salt()
     # Load ansible core modules
+    module_path = os.path.dirname(os.path.dirname(ansible.__file__))
     for path in ansible.modules.__path__:
         if str(pathlib.Path(path).parent.parent).endswith(".zip"):
             continue
-        for f in os.listdir(path):
-            if f.startswith("_") or not f.endswith(".py"):
+        prefix = "ansible_builtin" if salt else "ansible.builtin"
+        for entry in os.scandir(path):
+            if entry.name.startswith("_") or not entry.name.endswith(".py"):
                 continue
-            fname = f.removesuffix(".py")
-            # Ansible modules will be referred in salt as 2 parts ansible_builtin.ping instead of
-            # ansible.builtin.ping.
-            mod = f"ansible_builtin.{fname}" if has_salt() else f"ansible.builtin.{fname}"
-            module_name = f"{ansible.modules.__name__}.{fname}"
-            module_path = os.path.dirname(os.path.dirname(ansible.__file__))
-            ret.update(
-                load_module(
-                    module_key=mod,
-                    module_name=module_name,
-                    module_path=module_path,
-                    module_abs=os.path.join(*ansible.modules.__path__, f),
-                ),
-            )
+            fname = entry.name.removesuffix(".py")
+            ret.add(f"{prefix}.{fname}", f"{ansible.modules.__name__}.{fname}", module_path, entry.path)
 
     # Load collections when available
-    # Refer: https://docs.ansible.com/ansible/latest/collections_guide/collections_installing.html#installing-collections-with-ansible-galaxy
-    roots = sys.path
-    roots.append(os.path.expanduser(os.environ.get("ANSIBLE_COLLECTIONS_PATH", "~/.ansible/collections")))
-    for collections_root in roots:
-        if str(collections_root).endswith(".zip"):
+    for collections_root, namespace, coll_name, coll_path in iter_collections():
+        modules_dir = os.path.join(coll_path, "plugins", "modules")
+        if not os.path.isdir(modules_dir):
+            continue
+        prefix = f"{namespace}_{coll_name}" if salt else f"{namespace}.{coll_name}"
+        package = f"ansible_collections.{namespace}.{coll_name}.plugins.modules"
+        for entry in os.scandir(modules_dir):
+            if entry.name.startswith("_") or not entry.name.endswith(".py"):
+                continue
+            module = entry.name.removesuffix(".py")
+            ret.add(f"{prefix}.{module}", f"{package}.{module}", collections_root, entry.path)
+    return ret
+
+
+@functools.lru_cache
+def load_routing():
+    """
+    Build a table of module redirects and tombstones from the plugin_routing section
+    of ansible's builtin runtime and each collection's meta/runtime.yml.
+    """
+    # Lazy import
+    import ansible.config
+    import yaml
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    sources = [
+        ("ansible", "builtin", os.path.join(os.path.dirname(ansible.config.__file__), "ansible_builtin_runtime.yml"))
+    ]
+    sources.extend(
+        (namespace, coll_name, os.path.join(coll_path, "meta", "runtime.yml"))
+        for _, namespace, coll_name, coll_path in iter_collections()
+    )
+    ret = {}
+    salt = has_salt()
+    for namespace, coll_name, runtime_file in sources:
+        if not os.path.isfile(runtime_file):
+            continue
+        try:
+            with open(runtime_file) as fp:
+                runtime = yaml.load(fp, Loader=loader) or {}  # noqa: S506
+        except yaml.YAMLError:
+            log.warning("Unable to parse %s.", runtime_file)
             continue
-        # The glob will produce result like below
-        # ['/root/.ansible/collections/ansible_collections/amazon/aws/plugins/modules/cloudtrail_info.py', ...]
-        for f in glob.glob(os.path.join(collections_root, "ansible_collections/*/*/plugins/modules/*.py")):
-            relname = os.path.relpath(f.removesuffix(".py"), collections_root)
-            name_parts = relname.split("/")
-            namespace, coll_name, module = name_parts[1], name_parts[2], name_parts[-1]
-            if module.startswith("_"):
+        routes = (runtime.get("plugin_routing") or {}).get("modules") or {}
+        for name, route in routes.items():
+            key = f"{namespace}_{coll_name}.{name}" if salt else f"{namespace}.{coll_name}.{name}"
+            if not isinstance(route, dict) or key in ret:
                 continue
-            # Ansible modules will be referred in salt as 2 parts ansible_builtin.ping instead of
-            # ansible.builtin.ping.
-            mod = f"{namespace}_{coll_name}.{module}" if has_salt() else f"{namespace}.{coll_name}.{module}"
-            module_name = relname.replace("/", ".")
-            module_path = collections_root
-            module_abs = f
-            ret.update(
-                load_module(
-                    module_key=mod,
-                    module_name=module_name,
-                    module_path=module_path,
-                    module_abs=module_abs,
-                ),
-            )
+            if "tombstone" in route:
+                ret[key] = {"tombstone": (route["tombstone"] or {}).get("warning_text") or "Module was removed."}
+            elif "redirect" in route:
+                target = route["redirect"].split(".", 2)
+                if len(target) == 3:  # noqa: PLR2004
+                    ret[key] = {"redirect": f"{target[0]}_{target[1]}.{target[2]}" if salt else route["redirect"]}
     return ret
 
 
+def resolve(mod_name, modules):
+    """Find a module by name, following redirects declared in plugin routing"""
+    seen = set()
+    while mod_name not in modules:
+        route = load_routing().get(mod_name)
+        if route is None or mod_name in seen:
+            raise KeyError(mod_name)
+        if "tombstone" in route:
+            msg = f"{mod_name} has been removed. {route['tombstone']}"
+            raise KeyError(msg)
+        seen.add(mod_name)
+        log.debug("Module %s is redirected to %s.", mod_name, route["redirect"])
+        mod_name = route["redirect"]
+    return modules[mod_name]
+
+
+def cache_clear():
+    """Drop the module index and routing table"""
+    load_mods.cache_clear()
+    load_routing.cache_clear()
+
+
 def finder(fun):
     """
     Find and extract files when a module is imported from zip file
@@ -106,13 +229,69 @@ def finder(fun):
 @finder
 def get_module(mod_name):
     start = time.time()
-    modules = load_mods()
+    with ansiblecall.utils.metrics.phase("index"):
+        modules = load_mods()
     log.debug(
         "Loaded %s ansible modules. Elapsed: %0.03fs",
         len(modules),
         (time.time() - start),
     )
-    return modules[mod_name]
+    return resolve(mod_name=mod_name, modules=modules)
+
+
+def import_module(module_name):
+    """
+    Import an ansible module. Least recently used ansible modules are evicted from
+    sys.modules once more than `module_cache_size` of them are imported. Shared
+    module_utils are never evicted.
+    """
+    mod = importlib.import_module(module_name)
+    with _imported_lock:
+        IMPORTED[module_name] = None
+        IMPORTED.move_to_end(module_name)
+        max_size = ansiblecall.utils.config.get_config(key="module_cache_size")
+        while max_size and len(IMPORTED) > max_size:
+            evicted, _ = IMPORTED.popitem(last=False)
+            evict_module(module_name=evicted)
+    return mod
+
+
+def evict_module(module_name):
+    """Drop an imported module so that it can be garbage collected"""
+    sys.modules.pop(module_name, None)
+    parent, _, child = module_name.rpartition(".")
+    with contextlib.suppress(AttributeError):
+        delattr(sys.modules.get(parent), child)
+    log.debug("Evicted module %s.", module_name)
+
+
+def find_dependencies(module_name, module_abs):
+    """Return module_utils imported anywhere in an ansible module's source"""
+    with open(module_abs) as fp:
+        tree = ast.parse(fp.read())
+    package = module_name.rpartition(".")[0]
+    ret = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            try:
+                names = [importlib.util.resolve_name("." * node.level + (node.module or ""), package)]
+            except ImportError:
+                continue
+        else:
+            continue
+        ret.update(name for name in names if ".module_utils" in name)
+    return sorted(ret)
+
+
+def import_dependencies(module_name, module_abs):
+    """Import module_utils of an ansible module, including the ones imported lazily"""
+    for name in find_dependencies(module_name=module_name, module_abs=module_abs):
+        try:
+            importlib.import_module(name)
+        except ImportError as exc:
+            log.debug("Unable to preload %s for %s: %s", name, module_name, exc)
 
 
 def reload():
@@ -0,0 +1,149 @@
+import collections
+import contextlib
+import logging
+import math
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Callbacks receiving a Timings object at the end of every module call
+HOOKS = []
+
+_local = threading.local()
+
+
+class Timings(dict):
+    """Per-phase timings of a single module call"""
+
+    def __init__(self, *, module=None):
+        super().__init__()
+        self.module = module
+        self.phases = {}
+        self.total = None
+        self.failed = None
+
+    def __getattr__(self, key):
+        return self.get(key)
+
+    def __setattr__(self, key, value):
+        self[key] = value
+
+
+def current():
+    """Return timings of the module call running in this thread"""
+    return getattr(_local, "timings", None)
+
+
+@contextlib.contextmanager
+def call(mod_name):
+    """Collect timings for a module call and hand them over to the hooks"""
+    parent = current()
+    timings = Timings(module=mod_name)
+    _local.timings = timings
+    start = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings.total = time.perf_counter() - start
+        _local.timings = parent
+        notify(timings=timings)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Time a phase of the module call running in this thread"""
+    timings = current()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.phases[name] = timings.phases.get(name, 0.0) + time.perf_counter() - start
+
+
+def notify(timings):
+    for hook in HOOKS.copy():
+        try:
+            hook(timings)
+        except Exception:
+            log.exception("Metrics hook %r failed.", hook)
+
+
+def add_hook(fun):
+    """Register a callback to receive per-call timings"""
+    if fun not in HOOKS:
+        HOOKS.append(fun)
+    return fun
+
+
+def remove_hook(fun):
+    """Unregister a timings callback"""
+    with contextlib.suppress(ValueError):
+        HOOKS.remove(fun)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class Aggregator:
+    """In-process aggregation of call timings. Register with add_hook."""
+
+    percentiles = (50, 90, 99)
+
+    def __init__(self, samples=1000):
+        self.samples = samples
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = collections.Counter()
+            self.failures = collections.Counter()
+            self.totals = {}
+            self.phases = {}
+
+    def __call__(self, timings):
+        with self._lock:
+            mod_name = timings.module
+            self.counts[mod_name] += 1
+            if timings.failed:
+                self.failures[mod_name] += 1
+            self.totals.setdefault(mod_name, collections.deque(maxlen=self.samples)).append(timings.total)
+            phases = self.phases.setdefault(mod_name, {})
+            for name, elapsed in timings.phases.items():
+                phases.setdefault(name, collections.deque(maxlen=self.samples)).append(elapsed)
+
+    def stats(self, values):
+        values = list(values)
+        ret = {f"p{pct}": percentile(values, pct) for pct in self.percentiles}
+        ret["max"] = max(values, default=None)
+        return ret
+
+    def summary(self):
+        """Counts and percentiles per module and per phase"""
+        with self._lock:
+            return {
+                mod_name: {
+                    "count": count,
+                    "failed": self.failures[mod_name],
+                    "total": self.stats(self.totals[mod_name]),
+                    "phases": {name: self.stats(values) for name, values in self.phases[mod_name].items()},
+                }
+                for mod_name, count in self.counts.items()
+            }
+
+    def top(self, n=10, pct=90):
+        """Slowest modules ordered by the given percentile of total time"""
+        summary = self.summary()
+        return sorted(
+            summary.items(),
+            key=lambda item: item[1]["total"][f"p{pct}"] or 0,
+            reverse=True,
+        )[:n]
@@ -0,0 +1,116 @@
+import contextlib
+import fnmatch
+import logging
+import os
+import random
+import time
+
+import ansiblecall.utils.config
+
+log = logging.getLogger(__name__)
+
+# Settings enabled by profiling(), innermost last
+ACTIVE = []
+
+
+def settings_from_config():
+    config = ansiblecall.utils.config.get_config()
+    if not config.profile_dir:
+        return None
+    modules = config.profile_modules
+    return {
+        "dir": config.profile_dir,
+        "modules": modules.split(",") if isinstance(modules, str) else modules,
+        "rate": config.profile_rate,
+        "cprofile": True,
+        "tracemalloc": config.profile_tracemalloc,
+    }
+
+
+def current():
+    """Profiling settings in effect, None when profiling is off"""
+    return ACTIVE[-1] if ACTIVE else settings_from_config()
+
+
+def select(mod_name):
+    """Settings to profile a call of mod_name with, None when the call is not profiled"""
+    settings = current()
+    if not settings:
+        return None
+    modules = settings.get("modules")
+    if modules and not any(fnmatch.fnmatchcase(mod_name, pattern) for pattern in modules):
+        return None
+    if random.random() >= settings.get("rate", 1.0):  # noqa: S311
+        return None
+    return settings
+
+
+@contextlib.contextmanager
+def profiling(path, *, modules=None, rate=1.0, cprofile=True, tracemalloc=False):
+    """
+    Profile module calls made in this block, including respawned and forked ones. Only modules
+    matching one of the `modules` glob patterns are profiled, each call with probability `rate`.
+    cProfile stats (.prof) and tracemalloc snapshots (.tracemalloc) are written to `path`.
+    """
+    settings = {
+        "dir": os.fspath(path),
+        "modules": modules,
+        "rate": rate,
+        "cprofile": cprofile,
+        "tracemalloc": tracemalloc,
+    }
+    ACTIVE.append(settings)
+    try:
+        yield settings
+    finally:
+        ACTIVE.remove(settings)
+
+
+class Profiler:
+    """Run a block under cProfile and/or tracemalloc and write the results to the settings dir"""
+
+    def __init__(self, settings, mod_name):
+        self.settings = settings
+        self.mod_name = mod_name
+        self.profile = None
+        self.tracing = False
+
+    def filename(self, ext):
+        os.makedirs(self.settings["dir"], exist_ok=True)
+        name = f"{self.mod_name}.{time.time_ns()}.{os.getpid()}{ext}"
+        return os.path.join(self.settings["dir"], name)
+
+    def __enter__(self):
+        if self.settings.get("tracemalloc"):
+            # Lazy import
+            import tracemalloc
+
+            # Leave tracing started by someone else running
+            self.tracing = not tracemalloc.is_tracing()
+            if self.tracing:
+                tracemalloc.start()
+        if self.settings.get("cprofile", True):
+            # Lazy import
+            import cProfile
+
+            self.profile = cProfile.Profile()
+            try:
+                self.profile.enable()
+            except ValueError as exc:
+                # Another profiler is active in this process
+                log.warning("Unable to profile %s: %s", self.mod_name, exc)
+                self.profile = None
+        return self
+
+    def __exit__(self, *exc):
+        if self.profile:
+            self.profile.disable()
+            self.profile.dump_stats(self.filename(".prof"))
+        if self.settings.get("tracemalloc"):
+            # Lazy import
+            import tracemalloc
+
+            if tracemalloc.is_tracing():
+                tracemalloc.take_snapshot().dump(self.filename(".tracemalloc"))
+            if self.tracing:
+                tracemalloc.stop()
@@ -0,0 +1,91 @@
+import importlib.util
+import logging
+import os
+import py_compile
+import sys
+
+import ansiblecall.utils.config
+import ansiblecall.utils.loader
+
+log = logging.getLogger(__name__)
+
+
+def prefix():
+    """Bytecode cache dir of the running interpreter"""
+    cache_dir = ansiblecall.utils.config.get_config(key="cache_dir")
+    return os.path.join(cache_dir, "pycache", sys.implementation.cache_tag)
+
+
+def enable():
+    """
+    Write and read bytecode under cache_dir instead of __pycache__ dirs next to the sources,
+    so that modules in read-only locations are compiled once. An existing sys.pycache_prefix
+    (PYTHONPYCACHEPREFIX or -X pycache_prefix) is left alone.
+    """
+    if not ansiblecall.utils.config.get_config(key="pycache") or sys.pycache_prefix:
+        return
+    path = prefix()
+    os.makedirs(path, exist_ok=True)
+    sys.pycache_prefix = path
+    log.debug("Bytecode cache at %s.", path)
+
+
+def cache_file(path):
+    """
+    Bytecode file of a source under the prefix imports read from: sys.pycache_prefix once set,
+    prefix() otherwise. Mirrors importlib.util.cache_from_source.
+    """
+    head, tail = os.path.split(os.path.abspath(path))
+    name = f"{os.path.splitext(tail)[0]}.{sys.implementation.cache_tag}.pyc"
+    return os.path.join(sys.pycache_prefix or prefix(), os.path.splitdrive(head)[1].lstrip(os.sep), name)
+
+
+def origin(name):
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+    return spec and spec.has_location and spec.origin
+
+
+def sources(mod_names):
+    """Source files of modules and every module_utils they import, directly or through other module_utils"""
+    ret, queue = {}, []
+    for mod_name in mod_names:
+        mod = ansiblecall.utils.loader.get_module(mod_name=mod_name)
+        queue.append((mod.name, mod.abs))
+    while queue:
+        name, path = queue.pop()
+        if name in ret:
+            continue
+        ret[name] = path = path or origin(name)
+        if not path or not path.endswith(".py"):
+            continue
+        # Relative imports in a package __init__ resolve against the package itself
+        module_name = f"{name}.__init__" if path.endswith("__init__.py") else name
+        for dep in ansiblecall.utils.loader.find_dependencies(module_name=module_name, module_abs=path):
+            # Importing a module_utils runs the __init__ of its parent packages too
+            parts = dep.split(".")
+            queue.extend((".".join(parts[:i]), None) for i in range(1, len(parts) + 1))
+    return {name: path for name, path in ret.items() if path and path.endswith(".py")}
+
+
+def compile_modules(mod_names):
+    """
+    Compile modules and their module_utils into the bytecode cache. Returns the compiled source files.
+    Bytecode is never written next to the sources, also when pycache is not enabled yet.
+    """
+    ret = []
+    for name, path in sorted(sources(mod_names).items()):
+        try:
+            py_compile.compile(
+                path,
+                cfile=cache_file(path),
+                doraise=True,
+                invalidation_mode=py_compile.PycInvalidationMode.TIMESTAMP,
+            )
+        except (OSError, py_compile.PyCompileError) as exc:
+            log.warning("Unable to compile %s: %s", name, exc)
+            continue
+        ret.append(path)
+    return ret
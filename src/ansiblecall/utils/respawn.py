@@ -1,41 +1,222 @@
+import atexit
+import collections
+import contextlib
+import functools
 import json
 import logging
 import os
+import shlex
+import shutil
+import signal
 import subprocess
 import sys
 import tempfile
+import threading
 
-from ansible.module_utils.common.respawn import _create_payload, has_respawned
+from ansible.module_utils import basic
+from ansible.module_utils.common.respawn import has_respawned
 
+import ansiblecall.utils.capture
+import ansiblecall.utils.metrics
+import ansiblecall.utils.rt
 from ansiblecall.utils.cache import package_libs
+from ansiblecall.utils.config import get_config
 
 log = logging.getLogger(__name__)
 
+# Bytes of stderr reported when a respawned module fails
+STDERR_TAIL_SIZE = 64 * 1024
 
-def build_cmd(interpreter_path=None, runtime=None):
+# Packaged libraries reused by respawns of the same module: (fqn, modlib path, module path) -> (dir, pid).
+# Least recently used ones are removed past module_cache_size.
+LIBS = collections.OrderedDict()
+LIBS_LOCK = threading.Lock()
+
+# Module arguments are read from stdin, so the script only changes with the module, its libraries and limits
+BOOTSTRAP = """
+import runpy
+import sys
+{group}{limits}
+sys.path.insert(0, {modlib_path!r})
+
+from ansible.module_utils import basic
+basic._ANSIBLE_ARGS = sys.stdin.buffer.read()
+
+{run}
+"""
+
+RUN = "runpy.run_module({module_fqn!r}, init_globals=dict(_respawned=True), run_name='__main__', alter_sys=True)"
+
+# The packaged libraries include ansiblecall
+PROFILED_RUN = """
+import json
+from ansiblecall.utils.profile import Profiler
+
+with Profiler(json.loads({settings!r}), {module_fqn!r}):
+    {run}
+"""
+
+# Applied by the respawned interpreter itself, so that limits hold after sudo and su
+LIMITS = """
+import os
+import resource
+
+for name, value in {rlimits!r}:
+    limit = getattr(resource, name)
+    hard = resource.getrlimit(limit)[1]
+    value = value if hard == resource.RLIM_INFINITY else min(value, hard)
+    resource.setrlimit(limit, (value, value))
+if {nice!r}:
+    os.nice({nice!r})
+"""
+
+# Puts a module that may time out in its own process group and kills the group on SIGTERM, so that
+# processes the module started die with it, also below sudo where the caller cannot signal them
+GROUP = """
+import os
+import signal
+
+try:
+    os.setpgid(0, 0)
+except OSError:
+    # Already a session leader
+    pass
+signal.signal(signal.SIGTERM, lambda *_: os.killpg(0, signal.SIGKILL))
+"""
+
+# Seconds a timed out module gets to exit on SIGTERM before it is killed
+KILL_GRACE = 5
+
+
+@functools.lru_cache(maxsize=256)
+def bootstrap(module_fqn, modlib_path, rlimits=(), nice=None, profile=None, *, own_group=False):
+    """
+    Script running a module in a new interpreter. profile is the JSON of profiling settings,
+    own_group kills the processes of the module on SIGTERM.
+    """
+    limits = LIMITS.format(rlimits=rlimits, nice=nice) if rlimits or nice else ""
+    run = RUN.format(module_fqn=module_fqn)
+    if profile:
+        run = PROFILED_RUN.format(settings=profile, module_fqn=module_fqn, run=run)
+    return BOOTSTRAP.format(modlib_path=modlib_path, group=GROUP if own_group else "", limits=limits, run=run)
+
+
+def rlimits(runtime):
+    """Resource limits of a runtime as (resource name, value) pairs"""
+    if not runtime:
+        return ()
+    limits = (("RLIMIT_CPU", runtime.cpu_limit), ("RLIMIT_AS", runtime.memory_limit))
+    return tuple((name, int(value)) for name, value in limits if value)
+
+
+def package(path):
+    with ansiblecall.utils.metrics.phase("package"):
+        package_libs(path=path)
+    os.chmod(path, 0o555)  # noqa: S103
+
+
+def libs_dir():
+    """Directory with the libraries of the running module, packaged on first use"""
+    main = sys.modules["__main__"]
+    key = main._module_fqn, main._modlib_path, main._module_abs  # noqa: SLF001
+    with LIBS_LOCK:
+        if key not in LIBS:
+            path = tempfile.mkdtemp(prefix="ansiblecall-")
+            package(path)
+            LIBS[key] = path, os.getpid()
+        LIBS.move_to_end(key)
+        max_size = get_config(key="module_cache_size")
+        while max_size and len(LIBS) > max_size:
+            remove_libs(*LIBS.popitem(last=False)[1])
+        return LIBS[key][0]
+
+
+def remove_libs(path, pid):
+    # Forked children leave the libraries of their parent alone
+    if pid == os.getpid():
+        os.chmod(path, 0o755)  # noqa: S103
+        shutil.rmtree(path, ignore_errors=True)
+
+
+@atexit.register
+def clear_libs():
+    """Remove packaged libraries created by this process"""
+    with LIBS_LOCK:
+        for key, (path, pid) in list(LIBS.items()):
+            if pid != os.getpid():
+                continue
+            del LIBS[key]
+            remove_libs(path, pid)
+
+
+def write_output(fp):
+    """Copy respawned module output to stdout"""
+    if isinstance(sys.stdout, ansiblecall.utils.capture.Capture):
+        sys.stdout.write_from(fp)
+    else:
+        sys.stdout.write(fp.read().decode("utf-8", "surrogateescape"))
+
+
+def build_cmd(interpreter_path=None, runtime=None, args=("--",)):
+    python = [interpreter_path or "python3", *args]
+    if runtime and runtime.ionice:
+        ionice = shutil.which("ionice")
+        if ionice:
+            python = [ionice, "-c", str(runtime.ionice), *python]
+        else:
+            log.warning("ionice is not available, running %s without an I/O class.", python[0])
     cmd = []
     if runtime:
         if runtime.become:
             cmd.append("sudo")
         if runtime.become_user:
-            cmd.extend(["su", runtime.become_user, "-c"])
-    cmd.extend([interpreter_path or "python3", "--"])
-    return cmd
+            return [*cmd, "su", runtime.become_user, "-c", shlex.join(python)]
+    return cmd + python
+
+
+def killpg(pgid, sig):
+    # Processes of other users in the group, e.g. below sudo, are skipped
+    with contextlib.suppress(ProcessLookupError, PermissionError):
+        os.killpg(pgid, sig)
+
+
+def run(cmd, stdin, stdout, stderr, timeout=None):
+    """
+    Run a command to completion, in a new session when it has a timeout. Returns its exit status,
+    or None when it timed out, after the processes left in the session are killed.
+    """
+    with subprocess.Popen(
+        cmd, stdin=subprocess.PIPE, stdout=stdout, stderr=stderr, start_new_session=bool(timeout)
+    ) as proc:
+        try:
+            proc.communicate(input=stdin, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            # sudo relays SIGTERM to the module, SIGKILL would leave it running
+            killpg(proc.pid, signal.SIGTERM)
+            try:
+                proc.wait(timeout=KILL_GRACE)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            killpg(proc.pid, signal.SIGKILL)
+            return None
+    return proc.returncode
 
 
 def own_namespace(fun):
     def wrapped(*args, **kwargs):
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            package_libs(path=tmp_dir)
-            os.chmod(tmp_dir, 0o555)  # noqa: S103
-            sys.modules["__main__"]._modlib_path = tmp_dir  # noqa: SLF001
-            return fun(*args, **kwargs)
+        if get_config(key="respawn_strategy") == "fresh":
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                package(tmp_dir)
+                sys.modules["__main__"]._modlib_path = tmp_dir  # noqa: SLF001
+                return fun(*args, **kwargs)
+        sys.modules["__main__"]._modlib_path = libs_dir()  # noqa: SLF001
+        return fun(*args, **kwargs)
 
     return wrapped
 
 
 @own_namespace
-def respawn_module(interpreter_path=None, runtime=None):
+def respawn_module(interpreter_path=None, runtime=None, profile=None):
     """
     Respawn the currently-running Ansible Python module under the specified Python interpreter.
 
@@ -50,42 +231,42 @@ def respawn_module(interpreter_path=None, runtime=None):
     that the target interpreter exists, as ``respawn_module`` will not fail gracefully.
 
     :arg interpreter_path: path to a Python interpreter to respawn the current module
+    :arg profile: profiling settings to run the respawned module with
     """
 
     if has_respawned():
         raise Exception("module has already been respawned")  # noqa: TRY002, TRY003, EM101
 
     # FUTURE: we need a safe way to log that a respawn has occurred for forensic/debug purposes
-    payload = _create_payload()
     # Changes start
-    cmd = build_cmd(interpreter_path=interpreter_path, runtime=runtime)
-    ret = subprocess.run(
-        cmd,
-        input=payload,
-        text=True,
-        capture_output=True,
-        check=False,
+    main = sys.modules["__main__"]
+    code = bootstrap(
+        module_fqn=main._module_fqn,  # noqa: SLF001
+        modlib_path=main._modlib_path,  # noqa: SLF001
+        rlimits=rlimits(runtime),
+        nice=runtime and runtime.nice,
+        profile=json.dumps(profile, sort_keys=True) if profile else None,
+        own_group=bool(runtime and runtime.timeout),
     )
-    out = ret.stdout
-    if ret.returncode:
-        out = json.dumps({"changed": False, "failed": True, "msg": str(ret.stderr.strip())})
-    sys.stdout.flush()
-    sys.stdout.write(out)
+    # -B keeps the escalated user from writing bytecode into the shared libraries
+    cmd = build_cmd(interpreter_path=interpreter_path, runtime=runtime, args=("-B", "-c", code))
+    timeout = runtime and runtime.timeout
+    # Child output goes to temporary files instead of pipes read into memory
+    with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+        with ansiblecall.utils.metrics.phase("respawn"):
+            returncode = run(cmd, stdin=basic._ANSIBLE_ARGS, stdout=stdout, stderr=stderr, timeout=timeout)  # noqa: SLF001
+        sys.stdout.flush()
+        if returncode is None:
+            sys.stdout.write(json.dumps(ansiblecall.utils.rt.timed_out(timeout)))
+        elif returncode < 0 or (returncode and not os.fstat(stdout.fileno()).st_size):
+            err = ansiblecall.utils.capture.tail(stderr, size=STDERR_TAIL_SIZE).decode("utf-8", "replace")
+            if returncode < 0:
+                # Killed by a signal, e.g. SIGXCPU past the CPU limit
+                err = f"{err}\nModule killed by {signal.Signals(-returncode).name}"
+            sys.stdout.write(json.dumps({"changed": False, "failed": True, "msg": err.strip()}))
+        else:
+            stdout.seek(0)
+            write_output(stdout)
     # Changes end
-    # Cleanup cache files as escalated user
-    for target in ["__pycache__", "*.pyc"]:
-        cleanup = """
-import pathlib
-import os
-for p in pathlib.Path({modlib_path!r}).rglob({target!r}):
-    os.unlink(p)
-        """.format(modlib_path=sys.modules["__main__"]._modlib_path, target=target)  # noqa: SLF001
-        ret = subprocess.run(
-            cmd,
-            input=cleanup,
-            text=True,
-            capture_output=True,
-            check=False,
-        )
 
     sys.exit(0)
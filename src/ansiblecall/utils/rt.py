@@ -1,11 +1,37 @@
 class Runtime(dict):
-    def __init__(self, *, become=False, become_user=""):
+    """
+    How a module is respawned. timeout is in seconds, cpu_limit in seconds of CPU time and
+    memory_limit in bytes of address space. nice is added to the niceness of the module process
+    and ionice is an I/O scheduling class (1 realtime, 2 best-effort, 3 idle).
+    """
+
+    def __init__(
+        self,
+        *,
+        become=False,
+        become_user="",
+        timeout=None,
+        cpu_limit=None,
+        memory_limit=None,
+        nice=None,
+        ionice=None,
+    ):
         super().__init__()
         self.become = become
         self.become_user = become_user
+        self.timeout = timeout
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.nice = nice
+        self.ionice = ionice
 
     def __getattr__(self, key):
         return self.get(key)
 
     def __setattr__(self, key, value):
         self[key] = value
+
+
+def timed_out(timeout):
+    """Result of a module call killed at its deadline"""
+    return {"changed": False, "failed": True, "timed_out": True, "msg": f"Module timed out after {timeout} seconds"}
@@ -0,0 +1,70 @@
+import functools
+import json
+import logging
+
+import ansiblecall.utils.config
+
+log = logging.getLogger(__name__)
+
+# Tried in order when json_backend is "auto"
+BACKENDS = ("orjson", "msgspec", "json")
+
+
+def stdlib():
+    return lambda obj: json.dumps(obj).encode("utf-8"), json.loads
+
+
+def orjson():
+    # Lazy import
+    import orjson
+
+    return orjson.dumps, orjson.loads
+
+
+def msgspec():
+    # Lazy import
+    import msgspec
+
+    return msgspec.json.Encoder().encode, msgspec.json.Decoder().decode
+
+
+LOADERS = {"orjson": orjson, "msgspec": msgspec, "json": stdlib}
+
+
+@functools.cache
+def backend():
+    """(name, dumps, loads) of the configured backend. "auto" picks the first installed backend."""
+    name = ansiblecall.utils.config.get_config(key="json_backend")
+    for candidate in BACKENDS if name == "auto" else (name,):
+        try:
+            return candidate, *LOADERS[candidate]()
+        except ImportError:
+            if name != "auto":
+                log.warning("JSON backend %s is not installed, using json.", name)
+    return "json", *stdlib()
+
+
+def dumps(obj):
+    """
+    Serialize to JSON bytes reading back equal to obj. Values a fast backend writes differently
+    than the stdlib, e.g. NaN as null or a datetime as a string, or rejects, e.g. integers beyond
+    64 bits, are serialized by the stdlib, which raises for values it cannot handle either.
+    """
+    name, fast_dumps, fast_loads = backend()
+    if name != "json":
+        try:
+            data = fast_dumps(obj)
+            if fast_loads(data) == obj:
+                return data
+        except Exception:  # noqa: BLE001, S110
+            pass
+    return json.dumps(obj).encode("utf-8")
+
+
+def loads(data):
+    """Deserialize JSON bytes or str, falling back to the stdlib for input a fast backend rejects, e.g. NaN"""
+    _, _, fast_loads = backend()
+    try:
+        return fast_loads(data)
+    except Exception:  # noqa: BLE001
+        return json.loads(data)
@@ -0,0 +1,144 @@
+import errno
+import logging
+import os
+import socket
+import socketserver
+import stat
+import threading
+
+import ansiblecall
+import ansiblecall.utils.config
+import ansiblecall.utils.forkserver
+import ansiblecall.utils.loader
+import ansiblecall.utils.serialize
+
+log = logging.getLogger(__name__)
+
+
+def listening(socket_path):
+    """True when a daemon accepts connections on socket_path"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+class Handler(socketserver.StreamRequestHandler):
+    """Read newline delimited JSON requests and stream back one JSON result per request"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            ret = self.server.execute(line)
+            self.wfile.write(ansiblecall.utils.serialize.dumps(ret) + b"\n")
+            self.wfile.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Long-lived local daemon keeping the module index and imported modules warm.
+    Accepts {"module": ..., "params": {...}, "runtime": {...}} requests over a Unix socket.
+    With fork enabled, requests run concurrently in children of a fork server.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path=None, preload=None, *, fork=False):
+        self.socket_path = os.path.abspath(socket_path or ansiblecall.utils.config.get_config(key="socket_path"))
+        self.preload = preload or []
+        self.fork = fork
+        self.forkserver = None
+        # Modules patch process wide state while running in-process, run one at a time
+        self.lock = threading.Lock()
+        # Set once this server created the socket, so that only its own socket is removed on close
+        self.bound = False
+        os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        self.remove_stale_socket()
+        super().__init__(self.socket_path, Handler)
+
+    def remove_stale_socket(self):
+        """Remove a socket left behind by a daemon that is gone. Refuses to take over a live one."""
+        try:
+            mode = os.lstat(self.socket_path).st_mode
+        except FileNotFoundError:
+            return
+        # Leave anything else to fail the bind
+        if not stat.S_ISSOCK(mode):
+            return
+        if listening(self.socket_path):
+            raise OSError(errno.EADDRINUSE, "An ansiblecall daemon is already listening", self.socket_path)
+        os.unlink(self.socket_path)
+
+    def server_bind(self):
+        # Create the socket owner-only from the start instead of chmod after bind
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+        self.bound = True
+
+    def warm(self):
+        """Build the module index and import modules ahead of the first request"""
+        modules = ansiblecall.utils.loader.load_mods()
+        log.info("Loaded %s ansible modules.", len(modules))
+        if self.preload:
+            ansiblecall.preload(self.preload)
+            log.info("Preloaded %s.", ", ".join(self.preload))
+        if self.fork:
+            self.forkserver = ansiblecall.utils.forkserver.ForkServer(preload=self.preload).start()
+
+    def execute(self, data):
+        try:
+            request = ansiblecall.utils.serialize.loads(data)
+            runtime = request.get("runtime")
+            rt = ansiblecall.Runtime(**runtime) if runtime else None
+            if self.forkserver:
+                return self.forkserver.module(request["module"], rt=rt, **(request.get("params") or {}))
+            with self.lock:
+                return ansiblecall.module(request["module"], rt=rt, **(request.get("params") or {}))
+        except Exception as exc:
+            log.exception("Request failed.")
+            return {"failed": True, "msg": f"{type(exc).__name__}: {exc}"}
+
+    def server_close(self):
+        super().server_close()
+        if self.forkserver:
+            self.forkserver.stop()
+        if self.bound and os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def serve(socket_path=None, preload=None, *, fork=False):
+    """Run the daemon until interrupted"""
+    with Server(socket_path=socket_path, preload=preload, fork=fork) as server:
+        server.warm()
+        log.info("Listening on %s.", server.socket_path)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            log.info("Shutting down.")
+
+
+def call(mod_name, *, params=None, runtime=None, socket_path=None):
+    """Run a module on the daemon"""
+    return next(stream([(mod_name, params, runtime)], socket_path=socket_path))
+
+
+def stream(requests, socket_path=None):
+    """Send (module, params, runtime) requests over one connection and yield results as they arrive"""
+    socket_path = socket_path or ansiblecall.utils.config.get_config(key="socket_path")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        with sock.makefile("rwb") as fp:
+            for mod_name, params, runtime in requests:
+                request = {"module": mod_name, "params": params or {}, "runtime": runtime and dict(runtime)}
+                fp.write(ansiblecall.utils.serialize.dumps(request) + b"\n")
+                fp.flush()
+                line = fp.readline()
+                if not line:
+                    raise ConnectionError("Connection closed by the ansiblecall daemon.")  # noqa: TRY003, EM101
+                yield ansiblecall.utils.serialize.loads(line)
@@ -1,5 +1,28 @@
+import json
 import os
 import sys
 
+import pytest
+
 CODE_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
 sys.path.insert(0, CODE_DIR)
+
+
+@pytest.fixture
+def config_env(monkeypatch):
+    """
+    Call with settings, e.g. config_env(json_backend="json"), to override them through ANSIBLECALL_*
+    environment variables. Returns the config read again. The environment and config are restored afterwards.
+    """
+    # Lazy import
+    import ansiblecall.utils.config
+
+    def setenv(**settings):
+        for key, value in settings.items():
+            monkeypatch.setenv(f"ANSIBLECALL_{key.upper()}", value if isinstance(value, str) else json.dumps(value))
+        ansiblecall.utils.config.cache_clear()
+        return ansiblecall.utils.config.get_config()
+
+    yield setenv
+    monkeypatch.undo()
+    ansiblecall.utils.config.cache_clear()
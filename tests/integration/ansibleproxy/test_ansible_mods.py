@@ -69,7 +69,7 @@ def test_respawn_root_user():
 
 def test_cache():
     """Check if cache can be created and verify the sum"""
-    shutil.rmtree(os.path.expanduser("~/.ansiblecall"))
+    shutil.rmtree(os.path.expanduser("~/.ansiblecall"), ignore_errors=True)
     hash_sum = ansiblecall.cache(mod_name="ansible.builtin.file")
     with open(os.path.expanduser("~/.ansiblecall/cache/ansible.builtin.file.zip"), "rb") as fp:
         expected = hashlib.sha256(fp.read()).hexdigest()
@@ -0,0 +1,57 @@
+import gc
+import glob
+import io
+import os
+import tempfile
+
+import ansiblecall
+from ansiblecall.utils import capture
+
+
+def test_capture_spill():
+    """Ensure captured output spills to disk past the cap and the last line is found"""
+    cap = capture.Capture(max_size=1024)
+    cap.write("noise\n" * 1000)
+    assert cap.spilled is True
+    cap.write('\n{"ok": true}\n\n  \n')
+    assert cap.last_line() == '{"ok": true}'
+    cap.write("tail")
+    assert cap.last_line() == "tail"
+    cap.close()
+    assert capture.tail_line(io.BytesIO(b"")) == b""
+    assert capture.tail_line(io.BytesIO(b"one line")) == b"one line"
+
+
+def test_stdout_as():
+    """Ensure large stdout can be returned as a file path or line iterator"""
+    argv = ["seq", "1", "100000"]
+    ret = ansiblecall.module("ansible.builtin.command", argv=argv)
+    assert ret["stdout"].split("\n")[-1] == "100000"
+
+    ret = ansiblecall.module("ansible.builtin.command", argv=argv, stdout_as="path")
+    assert "stdout_lines" not in ret
+    with open(ret["stdout"]) as fp:
+        assert fp.read().split("\n")[-1] == "100000"
+    os.unlink(ret["stdout"])
+
+    ret = ansiblecall.module("ansible.builtin.command", argv=argv, stdout_as="iter")
+    lines = list(ret["stdout"])
+    assert len(lines) == 100000
+    assert lines[-1] == "100000"
+
+
+def test_stdout_as_iter_dropped():
+    """Ensure an unread stdout iterator leaves no file behind"""
+    spooled = os.path.join(tempfile.gettempdir(), "ansiblecall-*.stdout")
+    before = set(glob.glob(spooled))
+    ret = ansiblecall.module("ansible.builtin.command", argv=["seq", "1", "10"], stdout_as="iter")
+    assert set(glob.glob(spooled)) == before
+    del ret
+    gc.collect()
+    assert set(glob.glob(spooled)) == before
+
+
+def test_respawn_output():
+    """Ensure respawned module output is captured"""
+    ret = ansiblecall.module("ansible.builtin.command", argv=["seq", "1", "1000"], rt=ansiblecall.Runtime())
+    assert ret["stdout"].split("\n")[-1] == "1000"
@@ -0,0 +1,79 @@
+from ansiblecall.utils import coalesce, graph
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, mod_name, rt=None, **params):
+        self.calls.append((mod_name, params, rt))
+        names = params.get("name")
+        if "missing" in (names or []):
+            return {"failed": True, "msg": "No package matching 'missing'"}
+        return {"changed": True, "name": names}
+
+
+def test_coalesce_run():
+    """Ensure adjacent compatible package calls are merged into one"""
+    runner = Recorder()
+    calls = [
+        ("ansible.builtin.apt", {"name": "curl", "state": "present"}, None),
+        ("ansible.builtin.apt", {"name": ["git", "curl"], "state": "present"}, None),
+        ("ansible.builtin.apt", {"name": "vim", "state": "absent"}, None),
+        ("ansible_builtin.pip", {"name": "requests"}, None),
+        ("ansible_builtin.pip", {"name": "httpx"}, None),
+        ("ansible.builtin.ping", {}, None),
+        ("ansible.builtin.ping", {}, None),
+    ]
+    ret = coalesce.run(calls, runner=runner)
+    assert runner.calls == [
+        ("ansible.builtin.apt", {"name": ["curl", "git"], "state": "present"}, None),
+        ("ansible.builtin.apt", {"name": "vim", "state": "absent"}, None),
+        ("ansible_builtin.pip", {"name": ["requests", "httpx"]}, None),
+        ("ansible.builtin.ping", {}, None),
+        ("ansible.builtin.ping", {}, None),
+    ]
+    assert ret[0] == ret[1]
+    assert ret[0]["name"] == ["curl", "git"]
+    # Merged calls do not share a result
+    ret[0]["changed"] = False
+    assert ret[1]["changed"] is True
+    assert ret[3] == ret[4]
+    assert len(ret) == len(calls)
+
+
+def test_graph_coalesce():
+    """Ensure ready graph tasks are coalesced"""
+    runner = Recorder()
+    g = graph.Graph()
+    for pkg in ("curl", "git", "vim"):
+        g.add(pkg, "ansible.builtin.dnf", name=pkg)
+    g.add("after", "ansible.builtin.dnf", name="htop", requires=["curl"])
+    ret = g.run(runner=runner, coalesce=True)
+    assert [params["name"] for _, params, _ in runner.calls] == [["curl", "git", "vim"], "htop"]
+    assert all(ret[pkg].changed for pkg in ("curl", "git", "vim", "after"))
+    assert ret["curl"].ret == ret["git"].ret
+    assert ret["curl"].ret is not ret["git"].ret
+
+
+def test_coalesce_per_package():
+    """Ensure calls with per-package options are not merged and failures land on their own call"""
+    runner = Recorder()
+    calls = [
+        ("ansible.builtin.pip", {"name": "requests", "version": "2.31.0"}, None),
+        ("ansible.builtin.pip", {"name": "urllib3", "version": "2.31.0"}, None),
+        ("ansible.builtin.apt", {"name": "curl"}, None),
+        ("ansible.builtin.apt", {"name": "missing"}, None),
+        ("ansible.builtin.apt", {"name": "git"}, None),
+    ]
+    ret = coalesce.run(calls, runner=runner)
+    assert [params["name"] for _, params, _ in runner.calls] == [
+        "requests",
+        "urllib3",
+        ["curl", "missing", "git"],
+        "curl",
+        "missing",
+        "git",
+    ]
+    assert [r.get("failed", False) for r in ret] == [False, False, False, True, False]
+    assert ret[2]["name"] == "curl"
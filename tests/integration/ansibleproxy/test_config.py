@@ -0,0 +1,30 @@
+import zipfile
+
+import pytest
+
+import ansiblecall
+
+
+@pytest.fixture
+def config(config_env, tmp_path):
+    config_file = tmp_path.joinpath("config.yml")
+    config_file.write_text("module_cache_size: 64\ngraph_workers: 2\nunknown: 1\n")
+    return config_env(
+        config=str(config_file),
+        graph_workers=8,
+        cache_dir=str(tmp_path.joinpath("cache")),
+        bundle_compression="stored",
+    )
+
+
+def test_config(config, tmp_path):
+    """Ensure settings are read once from the config file and the environment"""
+    assert config is ansiblecall.config()
+    assert config.module_cache_size == 64
+    assert config.graph_workers == 8
+    assert "unknown" not in config
+    ansiblecall.cache(mod_name="ansible.builtin.ping", dest=str(tmp_path))
+    with zipfile.ZipFile(tmp_path.joinpath("ansible.builtin.ping.zip")) as zp:
+        infos = zp.infolist()
+    assert infos
+    assert {info.compress_type for info in infos} == {zipfile.ZIP_STORED}
@@ -0,0 +1,37 @@
+import os
+
+import ansiblecall
+from ansiblecall.utils.forkserver import ForkServer
+
+
+def test_drift_scan(tmp_path):
+    """Ensure only entries that would change are reported, with diffs, and nothing is changed"""
+    path = tmp_path.joinpath("config")
+    path.write_text("a\n")
+    desired = [
+        {"name": "line", "module": "ansible.builtin.lineinfile", "params": {"path": str(path), "line": "b"}},
+        {"name": "present", "module": "ansible.builtin.lineinfile", "params": {"path": str(path), "line": "a"}},
+        {"name": "touch", "module": "ansible.builtin.file", "params": {"path": str(path) + ".new", "state": "touch"}},
+        {"module": "ansible.builtin.ping"},
+        # wait_for documents no check mode support and is skipped instead of waiting
+        {"module": "ansible.builtin.wait_for", "params": {"timeout": 30}},
+        {"name": "missing", "module": "ansible.builtin.nothing"},
+    ]
+    reports = {ret["name"]: ret for ret in ansiblecall.drift_scan(desired, max_workers=4)}
+    assert sorted(reports) == ["line", "missing", "touch"]
+    assert reports["line"]["status"] == "changed"
+    assert reports["line"]["diff"][0]["after"] == "a\nb\n"
+    assert reports["missing"]["status"] == "failed"
+    assert path.read_text() == "a\n"
+    assert not os.path.exists(str(path) + ".new")
+
+
+def test_drift_scan_forkserver(tmp_path):
+    """Ensure entries run in a fork server passed by the caller, which is left running"""
+    path = tmp_path.joinpath("config")
+    desired = [{"name": "touch", "module": "ansible.builtin.file", "params": {"path": str(path), "state": "touch"}}]
+    with ForkServer(processes=2) as fs:
+        reports = list(ansiblecall.drift_scan(desired, forkserver=fs))
+        assert fs.module("ansible.builtin.ping") == {"ping": "pong"}
+    assert [ret["status"] for ret in reports] == ["changed"]
+    assert not path.exists()
@@ -0,0 +1,44 @@
+import time
+
+import ansiblecall
+from ansiblecall.utils.forkserver import ForkServer
+
+
+def test_forkserver():
+    """Ensure modules run isolated in forked children"""
+    agg = ansiblecall.Aggregator()
+    ansiblecall.add_metrics_hook(agg)
+    try:
+        with ForkServer(preload=["ansible.builtin.ping"], processes=4) as fs:
+            assert fs.module("ansible.builtin.ping", data="hello") == {"ping": "hello"}
+            ret = fs.module("ansible.builtin.file", path="/no/thing/here", state="touch")
+            assert ret["failed"] is True
+            assert fs.module("ansible.builtin.nothing")["failed"] is True
+            ret = fs.module("ansible.builtin.command", argv=["pwd"], chdir="/")
+            assert ret["stdout"] == "/"
+            # Independent calls run concurrently
+            start = time.perf_counter()
+            futures = [fs.submit("ansible.builtin.command", argv=["sleep", "1"]) for _ in range(4)]
+            assert [f.result()["ret"]["rc"] for f in futures] == [0, 0, 0, 0]
+            assert time.perf_counter() - start < 3
+    finally:
+        ansiblecall.remove_metrics_hook(agg)
+    summary = agg.summary()
+    assert summary["ansible.builtin.ping"]["count"] == 1
+    assert "main" in summary["ansible.builtin.ping"]["phases"]
+
+
+def test_forkserver_cancel():
+    """Ensure running and queued calls can be cancelled"""
+    with ForkServer(processes=1) as fs:
+        running = fs.submit("ansible.builtin.command", argv=["sleep", "30"])
+        queued = fs.submit("ansible.builtin.command", argv=["sleep", "30"])
+        start = time.perf_counter()
+        assert fs.cancel(queued) is True
+        assert fs.cancel(running) is True
+        assert queued.result()["ret"]["cancelled"] is True
+        assert running.result()["ret"]["cancelled"] is True
+        assert time.perf_counter() - start < 5
+        assert fs.cancel(running) is False
+        rt = ansiblecall.Runtime(timeout=1)
+        assert fs.module("ansible.builtin.command", argv=["sleep", "30"], rt=rt)["timed_out"] is True
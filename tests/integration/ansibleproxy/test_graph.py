@@ -0,0 +1,54 @@
+import pathlib
+import tempfile
+
+import pytest
+
+from ansiblecall.utils import graph
+
+
+def test_graph():
+    """Ensure dependent calls run in order, independent ones concurrently"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        foo_file = str(pathlib.Path(tmp_dir).joinpath("foo"))
+        g = graph.Graph()
+        g.add("sleep_a", "ansible.builtin.command", argv=["sleep", "1"])
+        g.add("sleep_b", "ansible.builtin.command", argv=["sleep", "1"])
+        g.add("touch", "ansible.builtin.file", path=foo_file, state="touch", requires=["sleep_a"])
+        g.add("on_change", "ansible.builtin.ping", requires=["touch"], when=graph.changed("touch"))
+        g.add("never", "ansible.builtin.ping", requires=["touch"], when=lambda _: False)
+        g.add("broken", "ansible.builtin.file", path="/no/thing/here", state="touch")
+        g.add("after_broken", "ansible.builtin.ping", requires=["broken"])
+        g.add("after_blocked", "ansible.builtin.ping", requires=["after_broken", "sleep_b"])
+        ret = g.run(max_workers=4)
+
+    assert ret.elapsed < 1.9
+    assert ret["touch"].status == graph.CHANGED
+    assert ret["on_change"].ret == {"ping": "pong"}
+    assert ret["never"].status == graph.SKIPPED
+    assert ret["broken"].status == graph.FAILED
+    assert ret["after_broken"].status == graph.BLOCKED
+    assert ret["after_blocked"].status == graph.BLOCKED
+    assert ret.failed is True
+    assert ret.critical_path[:2] == ["sleep_a", "touch"]
+    assert ret.critical_path_time >= ret["sleep_a"].elapsed + ret["touch"].elapsed
+
+
+def test_graph_validation():
+    """Ensure unknown dependencies and cycles are rejected"""
+    g = graph.Graph()
+    g.add("a", "ansible.builtin.ping", requires=["b"])
+    with pytest.raises(ValueError, match="unknown task"):
+        g.run()
+    g.add("b", "ansible.builtin.ping", requires=["a"])
+    with pytest.raises(ValueError, match="cycle"):
+        g.run()
+
+
+def test_graph_name_param():
+    """Ensure the task name does not clash with a module parameter called name"""
+    calls = []
+    g = graph.Graph()
+    g.add("pkg", "ansible.builtin.apt", name="nginx")
+    ret = g.run(runner=lambda mod_name, rt=None, **params: calls.append((mod_name, params, rt)) or {"changed": True})
+    assert calls == [("ansible.builtin.apt", {"name": "nginx"}, None)]
+    assert ret["pkg"].changed
@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+
+from tests.conftest import CODE_DIR
+
+# Budget for `import ansiblecall` in a fresh interpreter. Ansible itself must not be imported.
+IMPORT_BUDGET = 0.25
+
+
+def run_python(code):
+    ret = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": CODE_DIR},
+    )
+    return json.loads(ret.stdout)
+
+
+def test_import_budget():
+    """Ensure importing ansiblecall is cheap and defers ansible imports"""
+    ret = run_python(
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import ansiblecall\n"
+        "elapsed = time.perf_counter() - start\n"
+        "ansiblecall.config()\n"
+        "print(json.dumps({'elapsed': elapsed, 'modules': sorted(sys.modules)}))\n"
+    )
+    assert not [m for m in ret["modules"] if m == "ansible" or m.startswith("ansible.")]
+    assert "ansiblecall.utils.ctx" not in ret["modules"]
+    assert ret["elapsed"] < IMPORT_BUDGET
+
+
+def test_import_on_execution():
+    """Ensure ansible is imported once a module runs"""
+    ret = run_python(
+        "import json, sys\n"
+        "import ansiblecall\n"
+        "ret = ansiblecall.module('ansible.builtin.ping')\n"
+        "print(json.dumps({'ret': ret, 'loaded': 'ansible.module_utils.basic' in sys.modules}))\n"
+    )
+    assert ret == {"ret": {"ping": "pong"}, "loaded": True}
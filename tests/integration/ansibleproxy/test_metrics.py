@@ -0,0 +1,40 @@
+import ansiblecall
+from ansiblecall.utils import metrics
+
+
+def test_metrics_hook():
+    """Ensure per-phase timings are handed to hooks and aggregated"""
+    calls = []
+    agg = ansiblecall.Aggregator()
+    ansiblecall.add_metrics_hook(calls.append)
+    ansiblecall.add_metrics_hook(agg)
+    try:
+        ansiblecall.module("ansible.builtin.ping", data="hello")
+        ansiblecall.module("ansible.builtin.ping")
+        ansiblecall.module("ansible.builtin.file", path="/no/thing/here", state="touch")
+    finally:
+        ansiblecall.remove_metrics_hook(calls.append)
+        ansiblecall.remove_metrics_hook(agg)
+
+    assert len(calls) == 3
+    timings = calls[0]
+    assert timings.module == "ansible.builtin.ping"
+    assert timings.failed is False
+    assert {"index", "bundle", "args", "import", "main", "parse"} <= set(timings.phases)
+    assert timings.total >= sum(timings.phases.values())
+    assert calls[-1].failed is True
+
+    summary = agg.summary()
+    assert summary["ansible.builtin.ping"]["count"] == 2
+    assert summary["ansible.builtin.file"]["failed"] == 1
+    assert summary["ansible.builtin.ping"]["total"]["p50"] > 0
+    assert "main" in summary["ansible.builtin.ping"]["phases"]
+    assert [mod_name for mod_name, _ in agg.top(n=2)] == sorted(summary, key=lambda m: -summary[m]["total"]["p90"])
+
+
+def test_percentile():
+    """Ensure percentiles use the nearest rank"""
+    values = [5, 1, 4, 2, 3]
+    assert [metrics.percentile(values, pct) for pct in (0, 20, 21, 50, 90, 100)] == [1, 1, 2, 3, 5, 5]
+    assert metrics.percentile(list(range(1, 101)), 99) == 99
+    assert metrics.percentile([], 50) is None
@@ -0,0 +1,57 @@
+import sys
+import time
+
+import ansiblecall
+import ansiblecall.utils.config
+import ansiblecall.utils.loader
+
+
+def test_module_eviction(monkeypatch):
+    """Ensure least recently used ansible modules are evicted and sys.path does not grow"""
+    get_config = ansiblecall.utils.config.get_config
+    monkeypatch.setattr(
+        ansiblecall.utils.config,
+        "get_config",
+        lambda key=None: 2 if key == "module_cache_size" else get_config(key=key),
+    )
+    ansiblecall.module("ansible.builtin.ping")
+    path_len = len(sys.path)
+    ansiblecall.module("ansible.builtin.stat", path="/")
+    assert "ansible.modules.ping" in sys.modules
+    ansiblecall.module("ansible.builtin.ping")
+    ansiblecall.module("ansible.builtin.file", path="/", state="directory")
+    assert "ansible.modules.ping" in sys.modules
+    assert "ansible.modules.stat" not in sys.modules
+    assert not hasattr(sys.modules["ansible.modules"], "stat")
+    assert "ansible.module_utils.basic" in sys.modules
+    assert list(ansiblecall.utils.loader.IMPORTED) == ["ansible.modules.ping", "ansible.modules.file"]
+    # Evicted modules are imported again on demand
+    assert ansiblecall.module("ansible.builtin.stat", path="/")["stat"]["exists"] is True
+    assert len(sys.path) == path_len
+
+
+def test_preload():
+    """Ensure modules and their lazily imported module_utils can be preloaded"""
+    ansiblecall.utils.loader.evict_module(module_name="ansible.modules.apt")
+    ret = ansiblecall.preload(["ansible.builtin.apt", "ansible.builtin.ping"])
+    assert list(ret) == ["ansible.builtin.apt", "ansible.builtin.ping"]
+    assert all(elapsed > 0 for elapsed in ret.values())
+    assert "ansible.modules.apt" in sys.modules
+    mod = ansiblecall.utils.loader.get_module(mod_name="ansible.builtin.apt")
+    dependencies = ansiblecall.utils.loader.find_dependencies(module_name=mod.name, module_abs=mod.abs)
+    assert "ansible.module_utils.urls" in dependencies
+    assert all(name in sys.modules for name in dependencies)
+    assert ansiblecall.module("ansible.builtin.ping") == {"ping": "pong"}
+
+
+def test_preload_import_cost(monkeypatch):
+    """Ensure preload reports the import cost only, not the module lookup"""
+    get_module = ansiblecall.utils.loader.get_module
+
+    def slow_get_module(mod_name):
+        time.sleep(0.2)
+        return get_module(mod_name=mod_name)
+
+    monkeypatch.setattr(ansiblecall.utils.loader, "get_module", slow_get_module)
+    ret = ansiblecall.preload(["ansible.builtin.ping"])
+    assert 0 < ret["ansible.builtin.ping"] < 0.2
@@ -0,0 +1,38 @@
+import pstats
+
+import ansiblecall
+from ansiblecall.utils.forkserver import ForkServer
+
+
+def test_profile(tmp_path):
+    """Ensure matching in-process, respawned and forked calls are profiled"""
+    with ForkServer(processes=1) as fs, ansiblecall.profile(str(tmp_path), modules=["ansible.builtin.p*"]):
+        ansiblecall.module("ansible.builtin.ping")
+        ansiblecall.module("ansible.builtin.ping", rt=ansiblecall.Runtime())
+        fs.module("ansible.builtin.ping")
+        ansiblecall.module("ansible.builtin.stat", path="/")
+    profiles = sorted(tmp_path.glob("*.prof"))
+    assert len(profiles) == 3
+    assert {p.name.split(".")[2] for p in profiles} == {"ping"}
+    # Three different processes
+    assert len({p.name.split(".")[-2] for p in profiles}) == 3
+    for p in profiles:
+        assert pstats.Stats(str(p)).total_calls > 0
+
+
+def test_profile_sampling(tmp_path):
+    """Ensure memory snapshots are written and the sampling rate is applied"""
+    with ansiblecall.profile(str(tmp_path), rate=0.0):
+        ansiblecall.module("ansible.builtin.ping")
+    assert not list(tmp_path.iterdir())
+    with ansiblecall.profile(str(tmp_path), cprofile=False, tracemalloc=True):
+        ansiblecall.module("ansible.builtin.ping")
+    assert [p.suffix for p in tmp_path.iterdir()] == [".tracemalloc"]
+
+
+def test_profile_path(tmp_path):
+    """Ensure a pathlib.Path profile dir works for respawned calls"""
+    with ansiblecall.profile(tmp_path):
+        ret = ansiblecall.module("ansible.builtin.ping", rt=ansiblecall.Runtime())
+    assert ret == {"ping": "pong"}
+    assert len(list(tmp_path.glob("*.prof"))) == 1
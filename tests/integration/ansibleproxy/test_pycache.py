@@ -0,0 +1,29 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+import ansiblecall
+import ansiblecall.utils.config
+
+
+@pytest.fixture(params=[True, False])
+def pycache(request, config_env, monkeypatch, tmp_path):
+    monkeypatch.setattr(sys, "pycache_prefix", None)
+    config_env(pycache=request.param, cache_dir=str(tmp_path))
+    return tmp_path
+
+
+def test_compile_modules(pycache):
+    """Ensure modules and their module_utils are compiled under cache_dir, whether or not pycache is enabled"""
+    ansiblecall.utils.pycache.enable()
+    compiled = ansiblecall.compile_modules(["ansible.builtin.ping"])
+    names = {os.path.basename(path) for path in compiled}
+    assert {"ping.py", "basic.py", "__init__.py"} <= names
+    prefix = str(pycache.joinpath("pycache", sys.implementation.cache_tag))
+    assert sys.pycache_prefix == (prefix if ansiblecall.utils.config.get_config(key="pycache") else None)
+    # Restored by the fixture
+    sys.pycache_prefix = prefix
+    for path in compiled:
+        assert os.path.exists(importlib.util.cache_from_source(path))
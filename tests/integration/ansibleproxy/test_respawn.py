@@ -0,0 +1,87 @@
+import contextlib
+import os
+import shlex
+import time
+
+import ansiblecall
+from ansiblecall.utils import respawn
+from ansiblecall.utils.forkserver import ForkServer
+
+
+def test_respawn_reuses_libs():
+    """Ensure respawns of the same module package its libraries once"""
+    respawn.clear_libs()
+    phases = []
+
+    def hook(timings):
+        phases.append(timings.phases)
+
+    ansiblecall.add_metrics_hook(hook)
+    try:
+        rt = ansiblecall.Runtime()
+        for data in ("one", "two"):
+            assert ansiblecall.module("ansible.builtin.ping", rt=rt, data=data) == {"ping": data}
+    finally:
+        ansiblecall.remove_metrics_hook(hook)
+    assert "package" in phases[0]
+    assert "package" not in phases[1]
+    assert len([key for key in respawn.LIBS if key[0] == "ansible.modules.ping"]) == 1
+
+
+def test_build_cmd():
+    """Ensure the bootstrap survives su quoting"""
+    code = respawn.bootstrap(module_fqn="ansible.modules.ping", modlib_path="/tmp/it's")
+    cmd = respawn.build_cmd(runtime=ansiblecall.Runtime(become=True, become_user="john"), args=("-c", code))
+    assert cmd[:4] == ["sudo", "su", "john", "-c"]
+    assert shlex.split(cmd[4]) == ["python3", "-c", code]
+    assert respawn.build_cmd() == ["python3", "--"]
+
+
+def test_runtime_limits():
+    """Ensure respawned modules run with the runtime limits and are killed at the timeout"""
+    rt = ansiblecall.Runtime(cpu_limit=5, memory_limit=2**31, nice=3)
+    ret = ansiblecall.module("ansible.builtin.command", argv=["sh", "-c", "ulimit -t; ulimit -v; nice"], rt=rt)
+    assert ret["stdout"].split("\n") == ["5", str(2**21), "3"]
+
+    start = time.perf_counter()
+    ret = ansiblecall.module("ansible.builtin.command", argv=["sleep", "30"], rt=ansiblecall.Runtime(timeout=1))
+    assert ret["failed"] is True
+    assert ret["timed_out"] is True
+    assert time.perf_counter() - start < 5
+
+
+def running(cmdline):
+    """Pids of processes running cmdline"""
+    ret = []
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        with contextlib.suppress(OSError), open(f"/proc/{pid}/cmdline", "rb") as fp:
+            if fp.read().split(b"\0")[:-1] == [arg.encode() for arg in cmdline]:
+                ret.append(int(pid))
+    return ret
+
+
+def test_timeout_kills_processes():
+    """Ensure processes started by a module do not survive its timeout"""
+    argv = ["sleep", "47.5"]
+    rt = ansiblecall.Runtime(timeout=1)
+    assert ansiblecall.module("ansible.builtin.command", argv=["sh", "-c", "sleep 47.5; true"], rt=rt)["timed_out"]
+    with ForkServer(processes=1) as fs:
+        assert fs.module("ansible.builtin.command", argv=argv, rt=rt)["timed_out"]
+    time.sleep(0.2)
+    assert running(argv) == []
+
+
+def test_respawn_libs_bounded(config_env):
+    """Ensure packaged libraries are bounded by module_cache_size and dropped on refresh"""
+    respawn.clear_libs()
+    config_env(module_cache_size=1)
+    rt = ansiblecall.Runtime()
+    assert ansiblecall.module("ansible.builtin.ping", rt=rt) == {"ping": "pong"}
+    ((ping_dir, _),) = respawn.LIBS.values()
+    assert ansiblecall.module("ansible.builtin.stat", path="/", rt=rt)["stat"]["exists"] is True
+    assert [key[0] for key in respawn.LIBS] == ["ansible.modules.stat"]
+    assert not os.path.exists(ping_dir)
+    ((stat_dir, _),) = respawn.LIBS.values()
+    ansiblecall.refresh_modules()
+    assert not respawn.LIBS
+    assert not os.path.exists(stat_dir)
@@ -0,0 +1,57 @@
+import pathlib
+import tempfile
+
+import pytest
+
+import ansiblecall
+import ansiblecall.utils.loader
+
+RUNTIME = """
+plugin_routing:
+  modules:
+    old_ping:
+      redirect: acme.tools.pong
+    older_ping:
+      redirect: acme.tools.old_ping
+    gone:
+      tombstone:
+        removal_version: 2.0.0
+        warning_text: Use acme.tools.pong instead.
+"""
+
+PONG = """
+from ansible.module_utils.basic import AnsibleModule
+
+
+def main():
+    module = AnsibleModule(argument_spec={})
+    module.exit_json(pong=True)
+"""
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        coll = pathlib.Path(tmp_dir).joinpath("ansible_collections", "acme", "tools")
+        coll.joinpath("plugins", "modules").mkdir(parents=True)
+        coll.joinpath("meta").mkdir()
+        coll.joinpath("plugins", "modules", "pong.py").write_text(PONG)
+        coll.joinpath("meta", "runtime.yml").write_text(RUNTIME)
+        monkeypatch.syspath_prepend(tmp_dir)
+        ansiblecall.refresh_modules()
+        yield coll
+    monkeypatch.undo()
+    ansiblecall.refresh_modules()
+
+
+def test_routing(collection):  # noqa: ARG001
+    """Ensure redirected module names resolve and tombstones explain the removal"""
+    assert ansiblecall.module("acme.tools.pong") == {"pong": True}
+    assert ansiblecall.module("acme.tools.old_ping") == {"pong": True}
+    assert ansiblecall.module("acme.tools.older_ping") == {"pong": True}
+    with pytest.raises(KeyError, match=r"Use acme\.tools\.pong instead"):
+        ansiblecall.utils.loader.get_module(mod_name="acme.tools.gone")
+    with pytest.raises(KeyError):
+        ansiblecall.utils.loader.get_module(mod_name="acme.tools.nothing")
+    # Builtin short names moved to collections
+    assert ansiblecall.utils.loader.get_module(mod_name="ansible.builtin.ufw").key == "community.general.ufw"
@@ -0,0 +1,50 @@
+import datetime
+import json
+import math
+import uuid
+
+import pytest
+
+import ansiblecall
+from ansiblecall.utils import serialize
+
+
+@pytest.fixture(params=["auto", "json"])
+def backend(request, config_env):
+    config_env(json_backend=request.param)
+    serialize.backend.cache_clear()
+    yield request.param
+    serialize.backend.cache_clear()
+
+
+def test_serialize(backend):
+    """Ensure every backend reads back what the stdlib would"""
+    if backend == "json":
+        assert serialize.backend()[0] == "json"
+    values = [
+        {"results": [{"item": i, "changed": i % 2 == 0, "msg": "é"} for i in range(100)]},
+        {"big": 2**70, 1: "int key"},
+        [1.5, None, "line\nbreak"],
+    ]
+    for value in values:
+        assert serialize.loads(serialize.dumps(value)) == json.loads(json.dumps(value))
+    assert math.isnan(serialize.loads(b'{"n": NaN}')["n"])
+    # Non-finite floats are not turned into null
+    value = {"nan": math.nan, "inf": [math.inf, -math.inf]}
+    assert serialize.dumps(value) == json.dumps(value).encode()
+    ret = serialize.loads(serialize.dumps(value))
+    assert math.isnan(ret["nan"])
+    assert ret["inf"] == [math.inf, -math.inf]
+    assert serialize.loads(serialize.dumps((1, 2))) == [1, 2]
+    for value in ({"a": object()}, {"when": datetime.datetime.now(tz=datetime.timezone.utc)}, {"id": uuid.uuid4()}):
+        with pytest.raises(TypeError):
+            serialize.dumps(value)
+    with pytest.raises(json.JSONDecodeError):
+        serialize.loads("{")
+
+
+@pytest.mark.usefixtures("backend")
+def test_serialize_args():
+    """Ensure non-finite module arguments reach the module unchanged"""
+    assert ansiblecall.module("ansible.builtin.ping", data=math.inf) == {"ping": "inf"}
+    assert ansiblecall.module("ansible.builtin.ping", data=math.nan, rt=ansiblecall.Runtime()) == {"ping": "nan"}
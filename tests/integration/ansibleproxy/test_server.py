@@ -0,0 +1,86 @@
+import json
+import os
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+
+import pytest
+
+import ansiblecall.utils.server
+from tests.conftest import CODE_DIR
+
+
+@pytest.fixture(params=[False, True], ids=["inprocess", "fork"])
+def server(request):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        srv = ansiblecall.utils.server.Server(
+            socket_path=f"{tmp_dir}/ansiblecall.sock",
+            preload=["ansible.builtin.ping"],
+            fork=request.param,
+        )
+        srv.warm()
+        thread = threading.Thread(target=srv.serve_forever, daemon=True)
+        thread.start()
+        yield srv
+        srv.shutdown()
+        srv.server_close()
+        thread.join()
+
+
+def test_server_call(server):
+    """Ensure modules run on the daemon"""
+    ret = ansiblecall.utils.server.call(
+        "ansible.builtin.ping", params={"data": "hello"}, socket_path=server.socket_path
+    )
+    assert ret == {"ping": "hello"}
+    ret = ansiblecall.utils.server.call("ansible.builtin.nothing", socket_path=server.socket_path)
+    assert ret["failed"] is True
+    requests = [("ansible.builtin.ping", None, None), ("ansible.builtin.ping", {"data": "again"}, None)]
+    assert list(ansiblecall.utils.server.stream(requests, socket_path=server.socket_path)) == [
+        {"ping": "pong"},
+        {"ping": "again"},
+    ]
+
+
+def test_cli_call(server):
+    """Ensure the command line client streams results"""
+    cmd = [sys.executable, "-m", "ansiblecall.cli", "--socket", server.socket_path, "call"]
+    env = {"PYTHONPATH": CODE_DIR}
+    ret = subprocess.run(
+        [*cmd, "ansible.builtin.ping", "data=hello"], capture_output=True, text=True, env=env, check=True
+    )
+    assert json.loads(ret.stdout) == {"ping": "hello"}
+    requests = "\n".join(json.dumps({"module": "ansible.builtin.ping", "params": {"data": d}}) for d in "ab")
+    ret = subprocess.run([*cmd, "-"], input=requests, capture_output=True, text=True, env=env, check=True)
+    assert [json.loads(line) for line in ret.stdout.splitlines()] == [{"ping": "a"}, {"ping": "b"}]
+
+
+def test_server_socket(server):
+    """Ensure a live daemon's socket is not taken over and new sockets are owner-only"""
+    assert stat.S_IMODE(os.stat(server.socket_path).st_mode) == 0o600
+    with pytest.raises(OSError, match="already listening"):
+        ansiblecall.utils.server.Server(socket_path=server.socket_path)
+    assert ansiblecall.utils.server.call("ansible.builtin.ping", socket_path=server.socket_path) == {"ping": "pong"}
+
+
+def test_server_relative_socket(tmp_path, monkeypatch):
+    """Ensure a socket path relative to the working directory is accepted"""
+    monkeypatch.chdir(tmp_path)
+    srv = ansiblecall.utils.server.Server(socket_path="rel.sock")
+    assert srv.socket_path == str(tmp_path.joinpath("rel.sock"))
+    assert stat.S_ISSOCK(os.stat("rel.sock").st_mode)
+    srv.server_close()
+    assert not os.path.exists("rel.sock")
+
+
+def test_server_stale_socket(tmp_path):
+    """Ensure a socket left behind by a daemon that is gone is replaced"""
+    socket_path = str(tmp_path.joinpath("ansiblecall.sock"))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(socket_path)
+    srv = ansiblecall.utils.server.Server(socket_path=socket_path)
+    srv.server_close()
+    assert not os.path.exists(socket_path)
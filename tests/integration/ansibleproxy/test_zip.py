@@ -10,10 +10,14 @@ def test_salt(monkeypatch):
     """Mock __salt__ and test two part reference."""
     has_salt = MagicMock(return_value=True)
     monkeypatch.setattr(ansiblecall.utils.loader, "has_salt", has_salt)
-    ansiblecall.refresh_modules()
-    has_salt.assert_called()
+    modules = ansiblecall.refresh_modules()
+    # Evaluated once per index build, not per module
+    has_salt.assert_called_once()
     ret = ansiblecall.module("ansible_builtin.ping")
     assert ret == {"ping": "pong"}
+    record = modules["ansible_builtin.ping"]
+    assert (record.key, record.name) == ("ansible_builtin.ping", "ansible.modules.ping")
+    assert "ansible.builtin.ping" not in modules
 
     # Reset mock
     has_salt = MagicMock(return_value=False)
@@ -23,7 +27,7 @@ def test_salt(monkeypatch):
 
 def test_zip(monkeypatch):
     """Check module run from zip file"""
-    shutil.rmtree(os.path.expanduser("~/.ansiblecall"))
+    shutil.rmtree(os.path.expanduser("~/.ansiblecall"), ignore_errors=True)
     ansiblecall.cache(mod_name="ansible.builtin.ping")
     monkeypatch.syspath_prepend(os.path.expanduser("~/.ansiblecall/cache/ansible.builtin.ping.zip"))
     ansiblecall.utils.loader.reload()